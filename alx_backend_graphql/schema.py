@@ -1,16 +1,29 @@
-import graphene
-from crm.schema import Query as CRMQuery, Mutation as CRMMutation
+# The schema is built on first access (PEP 562 module __getattr__) so that
+# processes importing this module for settings or task discovery don't pay
+# for constructing the Graphene type graph.
+_schema = None
 
 
-class CRMQuery:
-    pass
+def build_schema():
+    import graphene
+    from crm.schema import Query as CRMQuery, Mutation as CRMMutation, Subscription as CRMSubscription
 
+    class Query(CRMQuery, graphene.ObjectType):
+        pass
 
-class Query(CRMQuery, graphene.ObjectType):
-    hello = graphene.String()
+    class Mutation(CRMMutation, graphene.ObjectType):
+        pass
 
-    def resolve_hello(root, info):
-        return "Hello, GraphQL!"
+    class Subscription(CRMSubscription, graphene.ObjectType):
+        pass
 
+    return graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
 
-schema = graphene.Schema(query=Query)
+
+def __getattr__(name):
+    global _schema
+    if name == "schema":
+        if _schema is None:
+            _schema = build_schema()
+        return _schema
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,3 +1,12 @@
-from .celery import app as celery_app
+# The Celery app is bound from CrmConfig.ready() so job processes running the
+# lean settings profile don't pay for importing Celery.
+
+
+def __getattr__(name):
+    if name == "celery_app":
+        from .celery import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ("celery_app",)
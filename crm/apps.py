@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class CrmConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'crm'
+
+    def ready(self):
+        from . import audit, counts
+        audit.connect_signals()
+        counts.connect_signals()
+
+        # shared_task proxies need the configured app before .delay() is called
+        if getattr(settings, 'CRM_LOAD_CELERY_APP', True):
+            from . import celery  # noqa: F401
@@ -0,0 +1,21 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+
+django_application = get_asgi_application()
+
+from crm.subscriptions import GraphQLWebSocketApp  # noqa: E402  (needs apps loaded)
+
+websocket_application = GraphQLWebSocketApp()
+
+
+async def application(scope, receive, send):
+    # HTTP goes to Django; WebSocket on /graphql carries subscriptions
+    if scope['type'] == 'websocket':
+        if scope['path'].rstrip('/') != '/graphql':
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
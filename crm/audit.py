@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Customer, Order, Product
+
+
+AUDITED_MODELS = (Customer, Product, Order)
+
+_actor = ContextVar('crm_audit_actor', default='')
+# entries committed inside collect(), written with one bulk_create when it ends
+_collected = ContextVar('crm_audit_collected', default=None)
+
+
+@contextmanager
+def actor(name):
+    token = _actor.set(name)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+@contextmanager
+def collect():
+    """Collect committed entries until the block exits, then write them at once."""
+    token = _collected.set(_EntryBuffer())
+    try:
+        yield
+    finally:
+        buffer = _collected.get()
+        _collected.reset(token)
+        _write(buffer.entries())
+
+
+@contextmanager
+def request_scope(actor_name=''):
+    with actor(actor_name), collect():
+        yield
+
+
+def _write(entries):
+    if entries:
+        logged_at = timezone.now()
+        for entry in entries:
+            entry.logged_at = logged_at
+        ChangeLogEntry.objects.using(router.db_for_write(ChangeLogEntry)).bulk_create(entries)
+
+
+class _EntryBuffer:
+    """Committed entries of one ``collect()`` block, in commit order.
+
+    Changes that follow a row's create are folded into the create entry.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def add(self, entry):
+        key = (entry.model, entry.object_id)
+        pending = self._entries.get(key)
+        if pending is None:
+            self._entries[key] = entry
+        elif pending.action == ChangeLogEntry.CREATE and entry.action != ChangeLogEntry.DELETE:
+            pending.diff.update(entry.diff if entry.action == ChangeLogEntry.CREATE else
+                                {field: change[1] for field, change in entry.diff.items()})
+        else:
+            # keep every other sequence distinct, in order
+            self._entries[key + (len(self._entries),)] = entry
+
+
+def _deliver(entry):
+    buffer = _collected.get()
+    if buffer is None:
+        _write([entry])
+    else:
+        buffer.add(entry)
+
+
+def record(instance, action, diff):
+    entry = ChangeLogEntry(
+        model=instance._meta.model_name, object_id=str(instance.pk),
+        action=action, actor=_actor.get(), diff=diff,
+    )
+    # immediate outside a transaction; a rolled-back savepoint discards its callbacks, and the entries with them
+    transaction.on_commit(lambda: _deliver(entry), using=instance._state.db or router.db_for_write(type(instance)))
+
+
+def values_by_pk(queryset, fields):
+    """``{pk: {field: value}}`` for ``queryset``, to diff around a ``QuerySet.update()``."""
+    return {row.pop('pk'): row for row in queryset.values('pk', *fields)}
+
+
+def record_updates(model, before, after):
+    """Log the rows an ``update()`` changed, from ``values_by_pk`` taken before and after it.
+
+    ``update()`` sends no signals, so bulk writers call this themselves.
+    """
+    for pk, old in before.items():
+        new = after.get(pk, {})
+        diff = {field: [value, new.get(field)] for field, value in old.items() if value != new.get(field)}
+        if diff:
+            record(model(pk=pk), ChangeLogEntry.UPDATE, diff)
+
+
+def _snapshot(instance):
+    return {f.attname: f.value_from_object(instance) for f in instance._meta.concrete_fields}
+
+
+def _on_pre_save(sender, instance, raw=False, using=None, **kwargs):
+    instance._audit_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._audit_before = (
+        type(instance)._base_manager.using(using).filter(pk=instance.pk).values().first()
+    )
+
+
+def _on_post_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    after = _snapshot(instance)
+    if created:
+        record(instance, ChangeLogEntry.CREATE, after)
+        return
+    before = getattr(instance, '_audit_before', None) or {}
+    diff = {k: [before.get(k), v] for k, v in after.items() if before.get(k) != v}
+    if diff:
+        record(instance, ChangeLogEntry.UPDATE, diff)
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    record(instance, ChangeLogEntry.DELETE, _snapshot(instance))
+
+
+def _on_products_changed(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    products = sorted(instance.products.values_list('pk', flat=True))
+    record(instance, ChangeLogEntry.UPDATE, {'products': [None, products]})
+
+
+def connect_signals():
+    for model in AUDITED_MODELS:
+        uid = f'crm.audit.{model._meta.model_name}'
+        pre_save.connect(_on_pre_save, sender=model, dispatch_uid=uid)
+        post_save.connect(_on_post_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_post_delete, sender=model, dispatch_uid=uid)
+    m2m_changed.connect(_on_products_changed, sender=Order.products.through, dispatch_uid='crm.audit.order_products')
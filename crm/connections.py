@@ -0,0 +1,98 @@
+from functools import partial
+
+import graphene
+from django.db.models.query import QuerySet
+from graphene import relay
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql_relay import connection_from_array_slice, cursor_to_offset, get_offset_with_default, offset_to_cursor
+
+from . import counts
+
+
+class CountableConnection(relay.Connection):
+    """Connection with an on-demand ``totalCount``.
+
+    Nothing is counted unless ``totalCount`` or ``isCountExact`` is selected;
+    root connections count with their configured strategy (``crm.counts``).
+    """
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(description="Number of rows matching the filter; see isCountExact")
+    is_count_exact = graphene.Boolean(description="False when totalCount came from a cache or an estimate")
+
+    def resolve_total_count(self, info):
+        return self._count()[0]
+
+    def resolve_is_count_exact(self, info):
+        return self._count()[1]
+
+    def _count(self):
+        result = getattr(self, '_count_result', None)
+        if result is None:
+            if getattr(self, 'length', None) is not None:
+                result = (self.length, True)  # already counted while paging
+            else:
+                result = counts.count(self.iterable, getattr(self, 'count_strategy', counts.EXACT))
+            self._count_result = result
+        return result
+
+
+class CountingConnectionField(DjangoFilterConnectionField):
+    """Filter connection that pages without ``COUNT(*)``.
+
+    ``first``/``after`` pages fetch one extra row to answer ``hasNextPage``;
+    only ``last`` still needs the full count. ``count_strategy`` picks how
+    ``totalCount`` is computed, overridable per field in ``CRM_COUNT_STRATEGIES``.
+    """
+
+    def __init__(self, type_, *args, count_strategy=None, **kwargs):
+        self.count_strategy = count_strategy
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        resolve = super().wrap_resolve(parent_resolver)
+
+        def resolver(root, info, **args):
+            connection = resolve(root, info, **args)
+            connection.count_strategy = counts.strategy_for(info.field_name, self.count_strategy)
+            return connection
+        return resolver
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        if not isinstance(iterable, QuerySet) or args.get("last") is not None:
+            return super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+
+        # same offset -> after conversion as DjangoConnectionField
+        offset = args.pop("offset", None)
+        after = args.get("after")
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args["after"] = offset_to_cursor(offset - 1)
+        if max_limit is not None and args.get("first") is None:
+            args["first"] = max_limit
+
+        slice_start = get_offset_with_default(args.get("after"), -1) + 1
+        first = args.get("first")
+        # one row past the page tells whether there is a next one
+        rows = list(iterable[slice_start:None if first is None else slice_start + first + 1])
+
+        connection = connection_from_array_slice(
+            rows,
+            args,
+            slice_start=slice_start,
+            array_length=slice_start + len(rows),
+            array_slice_length=len(rows),
+            connection_type=partial(connection_adapter, connection),
+            edge_type=connection.Edge,
+            page_info_type=page_info_adapter,
+        )
+        connection.iterable = iterable
+        connection.length = None
+        return connection
@@ -0,0 +1,119 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+STRATEGIES = (EXACT, CACHED, ESTIMATED)
+
+_GENERATION_PREFIX = 'crm:count-gen:'
+
+
+def strategy_for(field_name, default=None) -> str:
+    """Count strategy of a root connection: ``CRM_COUNT_STRATEGIES`` override, then the default."""
+    overrides = getattr(settings, 'CRM_COUNT_STRATEGIES', {})
+    strategy = overrides.get(field_name) or default or getattr(settings, 'CRM_COUNT_STRATEGY', EXACT)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown count strategy '{strategy}' for {field_name}")
+    return strategy
+
+
+def count(queryset, strategy=EXACT):
+    """Return ``(count, exact)`` for ``queryset`` using ``strategy``.
+
+    ``exact`` is True only when the rows were counted for this call. An
+    estimate below ``CRM_COUNT_EXACT_BELOW`` is replaced by a real count, and
+    estimates that cannot be made fall back to the cache.
+    """
+    if strategy == ESTIMATED:
+        estimate = _estimate(queryset)
+        if estimate is not None:
+            if estimate >= getattr(settings, 'CRM_COUNT_EXACT_BELOW', 1000):
+                return estimate, False
+            return queryset.count(), True
+        strategy = CACHED
+    if strategy == CACHED:
+        key = _cache_key(queryset)
+        value = cache.get(key)
+        if value is not None:
+            return value, False
+        value = queryset.count()
+        cache.set(key, value, getattr(settings, 'CRM_COUNT_CACHE_TTL', 60))
+        return value, True
+    return queryset.count(), True
+
+
+def _count_query(queryset):
+    """The rows ``count()`` sees: filters and their joins, without the projected columns or select_related."""
+    return queryset.order_by().values('pk').query
+
+
+def _tables(query):
+    return sorted({join.table_name for join in query.alias_map.values()} | {query.get_meta().db_table})
+
+
+def _cache_key(queryset):
+    """Key on the filtered SQL and the write generation of every table the filters read."""
+    query = _count_query(queryset)
+    tables = _tables(query)
+    sql, params = query.sql_with_params()
+    generations = cache.get_many([_GENERATION_PREFIX + table for table in tables])
+    parts = [queryset.db, sql, params, [generations.get(_GENERATION_PREFIX + t, 0) for t in tables]]
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'crm:count:{queryset.model._meta.label_lower}:{digest}'
+
+
+def _estimate(queryset):
+    """Row estimate from the planner (PostgreSQL) or the primary key range (whole tables)."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = _count_query(queryset).sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    if queryset.query.where:
+        return None  # no planner estimate for filtered sets here
+    # an index lookup instead of a table scan; only overcounts by deleted ids
+    pk = queryset.model._meta.pk
+    if not pk.get_internal_type().endswith('AutoField'):
+        return None
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX({connection.ops.quote_name(pk.column)}) FROM {table}')
+        return cursor.fetchone()[0] or 0
+
+
+def invalidate(model):
+    """Drop cached counts that read ``model``'s table, once the write commits."""
+    key = _GENERATION_PREFIX + model._meta.db_table
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def _on_write(sender, **kwargs):
+    invalidate(sender)
+
+
+def connect_signals():
+    from .models import Customer, Order, Product
+
+    for model in (Customer, Product, Order):
+        uid = f'crm.counts.{model._meta.model_name}'
+        post_save.connect(_on_write, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_write, sender=model, dispatch_uid=uid)
+    m2m_changed.connect(_on_write, sender=Order.products.through, dispatch_uid='crm.counts.order_products')
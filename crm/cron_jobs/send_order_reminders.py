@@ -3,15 +3,16 @@ import asyncio
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
-
 
 GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
 LOG_PATH = "/tmp/order_reminders_log.txt"
 
 
 async def fetch_recent_orders():
+    # gql/aiohttp are the bulk of this script's cold start; load them on use
+    from gql import Client, gql
+    from gql.transport.aiohttp import AIOHTTPTransport
+
     now = datetime.now(timezone.utc)
     seven_days_ago = now - timedelta(days=7)
 
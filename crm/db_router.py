@@ -0,0 +1,111 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+PRIMARY_DB = 'default'
+
+# Set for the duration of a request/job that must see its own writes
+_use_primary = ContextVar('crm_use_primary', default=False)
+
+# Replica chosen for the current request, so all of its reads see the same lag
+_replica = ContextVar('crm_replica', default=None)
+
+
+def sqlite_replica_databases(base_dir, count):
+    """DATABASES entries for ``count`` local SQLite replicas of the primary."""
+    return {
+        f'replica{i}': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': base_dir / f'db.replica{i}.sqlite3',
+            'TEST': {'MIRROR': PRIMARY_DB},
+        }
+        for i in range(1, count + 1)
+    }
+
+
+def replica_aliases():
+    return list(getattr(settings, 'CRM_REPLICA_DATABASES', []))
+
+
+def use_primary(value=True):
+    """Route reads in the current context to the primary. Returns a reset token."""
+    return _use_primary.set(value)
+
+
+def reset_primary(token):
+    _use_primary.reset(token)
+
+
+def is_primary_pinned() -> bool:
+    return _use_primary.get()
+
+
+def choose_replica():
+    """Pick the replica every read in the current context goes to. Returns a reset token."""
+    replicas = replica_aliases()
+    return _replica.set(random.choice(replicas) if replicas else None)
+
+
+def reset_replica(token):
+    _replica.reset(token)
+
+
+def routing_state():
+    """The current context's routing, to restore later with ``restore_routing``."""
+    return _use_primary.get(), _replica.get()
+
+
+@contextmanager
+def restore_routing(state):
+    """Route like the context ``state`` was taken in, e.g. while a streamed response is sent."""
+    primary, replica = state
+    primary_token, replica_token = _use_primary.set(primary), _replica.set(replica)
+    try:
+        yield
+    finally:
+        _replica.reset(replica_token)
+        _use_primary.reset(primary_token)
+
+
+@contextmanager
+def pin_primary():
+    token = use_primary(True)
+    try:
+        yield
+    finally:
+        reset_primary(token)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and spread reads across replica aliases.
+
+    Reads fall back to the primary when no replicas are configured or when
+    the current context has been pinned (mutations, sticky clients, jobs).
+    Within a request all reads go to the one replica ``choose_replica`` picked;
+    outside of one each read picks at random.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_primary.get():
+            return PRIMARY_DB
+        replicas = replica_aliases()
+        if not replicas:
+            return PRIMARY_DB
+        replica = _replica.get()
+        if replica in replicas:
+            return replica
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # all aliases hold the same data set
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are migrated too so local SQLite copies share the schema
+        return True
@@ -9,6 +9,10 @@ class CustomerFilter(django_filters.FilterSet):
     created_at__gte = df.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = df.IsoDateTimeFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = df.CharFilter(method='filter_phone_pattern')
+    # order summary columns (indexed)
+    last_order_before = df.IsoDateTimeFilter(field_name='last_order_date', lookup_expr='lt')
+    lifetime_revenue__gte = df.NumberFilter(field_name='lifetime_revenue', lookup_expr='gte')
+    order_count__gte = df.NumberFilter(field_name='order_count', lookup_expr='gte')
 
     def filter_phone_pattern(self, queryset, name, value):
         if not value:
@@ -0,0 +1,100 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _error(status, message):
+    return JsonResponse({"errors": [{"message": message}]}, status=status)
+
+
+def _claim(db, key, fingerprint):
+    """Return ``(record, created)``: the existing row for ``key``, or a new in-progress one."""
+    record = IdempotencyKey.objects.using(db).filter(key=key).first()
+    if record is not None:
+        return record, False
+    now = timezone.now()
+    try:
+        with transaction.atomic(using=db):
+            record = IdempotencyKey.objects.using(db).create(
+                key=key, fingerprint=fingerprint, created_at=now,
+                expires_at=now + timedelta(seconds=getattr(settings, 'CRM_IDEMPOTENCY_TTL_SECONDS', 86400)),
+            )
+        return record, True
+    except IntegrityError:
+        # lost the race to a concurrent duplicate
+        return IdempotencyKey.objects.using(db).filter(key=key).first(), False
+
+
+def _replay(request, record):
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type)
+    response[REPLAYED_HEADER] = 'true'
+    # the original wrote; keep the client's reads on the primary as it would have been
+    request._crm_wrote = True
+    return response
+
+
+def handle(request, key, get_response):
+    """Run ``get_response`` at most once per key and replay its stored response afterwards.
+
+    Duplicates arriving while the first request runs wait for it (up to
+    ``CRM_IDEMPOTENCY_WAIT_SECONDS``, then 409) instead of executing. Reusing a
+    key with a different body is a 422. Server errors are not stored, so the
+    client can retry them.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(400, f"{HEADER} must be at most {MAX_KEY_LENGTH} characters")
+    db = router.db_for_write(IdempotencyKey)
+    fingerprint = hashlib.sha256(request.body).hexdigest()
+    deadline = time.monotonic() + getattr(settings, 'CRM_IDEMPOTENCY_WAIT_SECONDS', 10)
+    lock_timeout = timedelta(seconds=getattr(settings, 'CRM_IDEMPOTENCY_LOCK_SECONDS', 60))
+    delay = 0.01
+
+    while True:
+        record, created = _claim(db, key, fingerprint)
+        if created:
+            break
+        if record is None:
+            continue  # removed between insert and read; claim again
+        now = timezone.now()
+        if record.expires_at <= now or (record.status_code is None and record.created_at <= now - lock_timeout):
+            # expired, or claimed by a request that died; compare-and-delete so only one retry takes over
+            IdempotencyKey.objects.using(db).filter(pk=record.pk, created_at=record.created_at).delete()
+            continue
+        if record.fingerprint != fingerprint:
+            return _error(422, f"{HEADER} was already used with a different request body")
+        if record.status_code is not None:
+            return _replay(request, record)
+        if time.monotonic() >= deadline:
+            response = _error(409, f"A request with this {HEADER} is still in progress")
+            response['Retry-After'] = '1'
+            return response
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+
+    try:
+        response = get_response()
+    except BaseException:
+        IdempotencyKey.objects.using(db).filter(pk=record.pk).delete()
+        raise
+    if response.status_code >= 500 or response.streaming:
+        IdempotencyKey.objects.using(db).filter(pk=record.pk).delete()
+        return response
+    IdempotencyKey.objects.using(db).filter(pk=record.pk).update(
+        status_code=response.status_code,
+        content_type=response.get('Content-Type', ''),
+        body=response.content.decode(response.charset or 'utf-8'),
+        completed_at=timezone.now(),
+    )
+    return response
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.models import ChangeLogEntry
+
+
+class Command(BaseCommand):
+    help = "Delete change log entries older than the retention window, oldest first"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CRM_CHANGE_LOG_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # ids can commit out of order, so select by timestamp rather than by an id boundary
+        expired = ChangeLogEntry.objects.filter(timestamp__lt=cutoff).order_by('pk').values_list('pk', flat=True)
+        deleted = 0
+        while True:
+            batch = list(expired[:options['batch_size']])
+            if not batch:
+                break
+            deleted += ChangeLogEntry.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f"Removed {deleted} change log entries older than {options['days']} days")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm import counts
+from crm.db_router import pin_primary
+from crm.models import Customer
+
+
+class Command(BaseCommand):
+    help = "Recompute last_order_date, order_count and lifetime_revenue for every customer"
+
+    def handle(self, *args, **options):
+        with pin_primary():
+            updated = Customer.objects.rebuild_order_stats()
+            counts.invalidate(Customer)
+        self.stdout.write(f"Rebuilt order stats for {updated} customer(s)")
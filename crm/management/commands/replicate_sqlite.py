@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Stand-in replicator: copy the primary SQLite file onto each replica alias"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Seconds between syncs; 0 runs a single pass")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if 'sqlite3' not in primary['ENGINE']:
+            raise CommandError("replicate_sqlite only supports SQLite databases")
+        replicas = [settings.DATABASES[alias]['NAME'] for alias in settings.CRM_REPLICA_DATABASES]
+        if not replicas:
+            raise CommandError("No replicas configured; set CRM_SQLITE_REPLICAS")
+
+        interval = options['interval']
+        while True:
+            self._sync(str(primary['NAME']), [str(r) for r in replicas])
+            self.stdout.write(f"Synced {len(replicas)} replica(s)")
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    @staticmethod
+    def _sync(source_path, target_paths):
+        # online backup API gives each replica a consistent snapshot
+        source = sqlite3.connect(source_path)
+        try:
+            for path in target_paths:
+                target = sqlite3.connect(path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
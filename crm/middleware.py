@@ -0,0 +1,107 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from graphql import OperationType
+
+from . import audit
+from .db_router import choose_replica, is_primary_pinned, reset_primary, reset_replica, use_primary
+
+
+STICKY_COOKIE = 'crm_primary_until'
+QUERY_COUNT_HEADER = 'X-DB-Queries'
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a client's reads to the primary for a short window after it mutates.
+
+    The window is carried in a cookie so it survives across worker processes.
+    Otherwise the request reads from a single replica, chosen here.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = use_primary(self._is_sticky(request))
+        replica_token = choose_replica()
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(replica_token)
+            reset_primary(token)
+        if getattr(request, '_crm_wrote', False):
+            window = getattr(settings, 'CRM_REPLICA_STICKY_SECONDS', 5)
+            if window > 0:
+                response.set_cookie(STICKY_COOKIE, str(time.time() + window), max_age=window, httponly=True)
+        return response
+
+    @staticmethod
+    def _is_sticky(request) -> bool:
+        raw = request.COOKIES.get(STICKY_COOKIE)
+        if not raw:
+            return False
+        try:
+            return float(raw) > time.time()
+        except ValueError:
+            return False
+
+
+class PrimaryForMutationsMiddleware:
+    """Graphene middleware: run every field of a mutation against the primary."""
+
+    def resolve(self, next, root, info, **args):
+        if root is None and info.operation.operation == OperationType.MUTATION:
+            # ReplicaStickinessMiddleware resets this when the request ends
+            if not is_primary_pinned():
+                use_primary(True)
+            setattr(info.context, '_crm_wrote', True)
+        return next(root, info, **args)
+
+
+class AuditMiddleware:
+    """Write the request's change log entries with one insert after the view returns."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            actor = user.get_username()
+        else:
+            actor = request.META.get('REMOTE_ADDR', '')
+        with audit.request_scope(actor):
+            return self.get_response(request)
+
+
+class QueryCountMiddleware:
+    """Report the SQL queries a request ran in an ``X-DB-Queries`` header.
+
+    Enabled by ``CRM_QUERY_COUNT_HEADER`` (defaults to DEBUG) for load tests
+    such as ``scripts/replay_traffic.py``. Only queries run on the request's
+    thread are counted; streamed responses get no header.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CRM_QUERY_COUNT_HEADER', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        if not response.streaming:
+            response[QUERY_COUNT_HEADER] = str(count)
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.15 on 2026-10-19 18:29
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_stats(apps, schema_editor):
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    Customer.objects.update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        lifetime_revenue=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_order_date=Subquery(orders.annotate(latest=Max('order_date')).values('latest')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_alter_customer_id_alter_customer_name_alter_order_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_revenue',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_order_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.15 on 2026-10-19 19:06
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_logged_at(apps, schema_editor):
+    # existing entries are long committed; let the feed serve them straight away
+    ChangeLogEntry = apps.get_model('crm', 'ChangeLogEntry')
+    ChangeLogEntry.objects.update(logged_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelogentry',
+            name='logged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_logged_at, migrations.RunPython.noop),
+    ]
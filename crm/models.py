@@ -1,16 +1,66 @@
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 
 
+class CustomerQuerySet(models.QuerySet):
+    def rebuild_order_stats(self):
+        """Recompute the order summary columns from the orders table in one UPDATE."""
+        orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+        return self.update(
+            order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+            lifetime_revenue=Coalesce(
+                Subquery(orders.annotate(total=Sum('total_amount')).values('total')),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+            last_order_date=Subquery(orders.annotate(latest=Max('order_date')).values('latest')),
+        )
+
+    def inactive_since(self, cutoff):
+        """Customers without an order on or after ``cutoff``.
+
+        The indexed ``last_order_date`` picks the candidates, and each one is
+        re-checked against the orders table. Orders written without
+        ``record_order`` leave the summary stale; that can keep a customer out of
+        the result, but never put an active one in it.
+        """
+        recent_orders = Order.objects.filter(customer=OuterRef('pk'), order_date__gte=cutoff)
+        return self.filter(
+            models.Q(last_order_date__lt=cutoff) | models.Q(last_order_date__isnull=True)
+        ).filter(~Exists(recent_orders))
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=32, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Order summary, kept current by record_order() and rebuildable with
+    # `manage.py rebuild_customer_stats`
+    last_order_date = models.DateTimeField(null=True, blank=True, db_index=True)
+    order_count = models.PositiveIntegerField(default=0, db_index=True)
+    lifetime_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, db_index=True)
+
+    objects = CustomerQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def record_order(customer_id, total_amount, order_date):
+        """Fold one new order into the customer's summary columns."""
+        return Customer.objects.filter(pk=customer_id).update(
+            order_count=F('order_count') + 1,
+            lifetime_revenue=F('lifetime_revenue') + total_amount,
+            last_order_date=Greatest(Coalesce(F('last_order_date'), Value(order_date)), Value(order_date)),
+        )
+
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
@@ -22,12 +72,32 @@ class Product(models.Model):
         return self.name
 
 
+class OrderQuerySet(models.QuerySet):
+    def unpaid(self):
+        return self.filter(paid_at__isnull=True)
+
+    def recompute_totals(self):
+        """Set total_amount to the sum of current product prices in one UPDATE."""
+        lines = Order.products.through.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.update(
+            total_amount=Coalesce(
+                Subquery(lines.annotate(total=Sum('product__price')).values('total')),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     products = models.ManyToManyField(Product, related_name='orders')
     order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # totals of paid orders are frozen; price changes only reach unpaid ones
+    paid_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return f"Order #{self.pk} for {self.customer.name}"
@@ -36,3 +106,73 @@ class Order(models.Model):
         total = sum((p.price for p in self.products.all()), start=0)
         self.total_amount = total
         return total
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only record of a create/update/delete; the id doubles as the feed cursor."""
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    model = models.CharField(max_length=32)
+    object_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    actor = models.CharField(max_length=150, blank=True, default='')
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    # set just before the insert; the feed only serves entries older than its settle window
+    logged_at = models.DateTimeField(default=timezone.now)
+    diff = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['model', 'object_id'])]
+
+    def __str__(self):
+        return f"{self.action} {self.model}#{self.object_id}"
+
+
+class BulkJob(models.Model):
+    """Progress of a background bulk operation, polled through the ``bulkJob`` query."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    products_updated = models.PositiveIntegerField(default=0)
+    orders_updated = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a mutation request sent with an ``Idempotency-Key`` header.
+
+    A row without ``status_code`` is a claim: the first request is still running
+    and duplicates wait for it (see ``crm.idempotency``).
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
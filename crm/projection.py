@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql import FieldNode, FragmentSpreadNode, GraphQLObjectType, get_named_type
+
+
+def collect_selections(info, selection_sets, type_name):
+    """Merge the fields selected on ``type_name`` across fragments.
+
+    Returns ``{field name: [FieldNode, ...]}``. ``@skip``/``@include`` are not
+    evaluated: selecting too much is safe, selecting too little is not.
+    """
+    fields = {}
+    for selection_set in selection_sets:
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+            else:
+                fragment = selection
+            if fragment is None or not _applies(info, fragment.type_condition, type_name):
+                continue
+            for name, nodes in collect_selections(info, [fragment.selection_set], type_name).items():
+                fields.setdefault(name, []).extend(nodes)
+    return fields
+
+
+def _applies(info, type_condition, type_name):
+    if type_condition is None:
+        return True
+    name = type_condition.name.value
+    # interface/union conditions (e.g. `... on Node`) may match
+    return name == type_name or not isinstance(info.schema.get_type(name), GraphQLObjectType)
+
+
+def _subfields(info, object_type, name, nodes):
+    related_type = get_named_type(object_type.fields[name].type)
+    return related_type, collect_selections(info, [node.selection_set for node in nodes], related_type.name)
+
+
+def _connection_nodes(info, connection_type, fields):
+    """``edges { node { ... } }`` of a connection selection -> (node type, node fields)."""
+    edge_type, edge_fields = _subfields(info, connection_type, "edges", fields.get("edges", []))
+    return _subfields(info, edge_type, "node", edge_fields.get("node", []))
+
+
+def _model(object_type):
+    meta = getattr(getattr(object_type, "graphene_type", None), "_meta", None)
+    return getattr(meta, "model", None)
+
+
+def _plan(info, object_type, fields, prefix=""):
+    """Columns, joins and prefetches needed to resolve ``fields`` on ``object_type``.
+
+    Selected fields map to model fields by name (``orderDate`` -> ``order_date``);
+    computed fields can name the model field they read in the node type's
+    ``projection_sources``. Any other computed field could read anything, so its
+    level keeps full rows (``columns`` is None), though joins are still pruned.
+    """
+    model = _model(object_type)
+    if model is None:
+        return None, [], []
+    sources = getattr(object_type.graphene_type, "projection_sources", {})
+    model_fields = {to_camel_case(f.name): f for f in model._meta.get_fields() if not f.auto_created}
+
+    columns = [prefix + model._meta.pk.name]
+    relations = {}  # model field -> (related node type, merged selection)
+    for name, nodes in fields.items():
+        if name in ("id", "__typename"):
+            continue
+        field = model_fields.get(to_camel_case(sources.get(name, name)))
+        if field is None:
+            columns = None
+            continue
+        if not field.is_relation:
+            if columns is not None:
+                columns.append(prefix + field.name)
+            continue
+        related_type, related_fields = _subfields(info, object_type, name, nodes)
+        if _model(related_type) is None and "edges" in related_type.fields:
+            related_type, related_fields = _connection_nodes(info, related_type, related_fields)
+        # several GraphQL fields may read one relation (e.g. `product` and `products`)
+        merged = relations.setdefault(field, (related_type, {}))[1]
+        for key, key_nodes in related_fields.items():
+            merged.setdefault(key, []).extend(key_nodes)
+
+    select_related = []
+    prefetch = []
+    for field, (related_type, related_fields) in relations.items():
+        if field.many_to_many or field.one_to_many:
+            queryset = project(field.related_model._default_manager.all(), info, related_type, related_fields)
+            prefetch.append(Prefetch(prefix + field.name, queryset=queryset))
+            continue
+
+        # forward foreign key: join it, restricted to what the nested selection reads
+        related_columns, related_joins, related_prefetch = _plan(
+            info, related_type, related_fields, prefix + field.name + "__"
+        )
+        select_related.append(prefix + field.name)
+        select_related.extend(related_joins)
+        prefetch.extend(related_prefetch)
+        if columns is not None:
+            columns.append(prefix + field.name)
+            # None here loads the whole related row
+            columns.extend(related_columns or ())
+    return columns, select_related, prefetch
+
+
+def project(queryset, info, object_type, fields):
+    """Restrict ``queryset`` to the columns and relations ``fields`` select.
+
+    The joins and prefetches already on ``queryset`` are what it loads with
+    ``CRM_QUERY_PROJECTION = False``; otherwise they are replaced by the plan.
+    """
+    if not getattr(settings, "CRM_QUERY_PROJECTION", True):
+        return queryset
+    columns, select_related, prefetch = _plan(info, object_type, fields)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if columns is not None:
+        queryset = queryset.only(*columns)
+    return queryset
+
+
+def project_connection(queryset, info):
+    """Project a connection resolver's queryset onto its ``edges { node { ... } }`` selection."""
+    connection_type = get_named_type(info.return_type)
+    root_fields = collect_selections(info, [node.selection_set for node in info.field_nodes], connection_type.name)
+    node_type, node_fields = _connection_nodes(info, connection_type, root_fields)
+    return project(queryset, info, node_type, node_fields)
+
+
+def project_nodes(queryset, info, type_name):
+    """Project a ``node``/``nodes`` lookup onto the fields selected for ``type_name``."""
+    fields = collect_selections(info, [node.selection_set for node in info.field_nodes], type_name)
+    return project(queryset, info, info.schema.get_type(type_name), fields)
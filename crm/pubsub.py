@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL_PREFIX = 'crm:'
+
+
+class Subscriber:
+    """Bounded queue owned by one event loop.
+
+    Publishers never block: when the queue is full the oldest message is
+    dropped (and counted) so a slow consumer only loses its own backlog.
+    """
+
+    def __init__(self, maxsize=None, loop=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'CRM_SUBSCRIPTION_QUEUE_SIZE', 100)
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        """Enqueue from the owning loop, shedding the oldest message if full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """In-process topic fan-out, safe to publish to from any thread."""
+
+    def __init__(self):
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, maxsize=None) -> Subscriber:
+        subscriber = Subscriber(maxsize)
+        with self._lock:
+            self._topics[topic].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, topic, subscriber):
+        with self._lock:
+            self._topics[topic].discard(subscriber)
+
+    def subscriber_count(self, topic) -> int:
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic, message):
+        self.deliver(topic, message)
+
+    def deliver(self, topic, message):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        by_loop = defaultdict(list)
+        for subscriber in subscribers:
+            by_loop[subscriber.loop].append(subscriber)
+        # one wake-up per event loop, not per subscriber
+        for loop, group in by_loop.items():
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(_offer_all, group, message)
+
+
+def _offer_all(subscribers, message):
+    for subscriber in subscribers:
+        subscriber.offer(message)
+
+
+class RedisBroker(Broker):
+    """Broker relayed through a Redis-compatible server for multi-process fan-out.
+
+    Publishes go to ``PUBLISH crm:<topic>``; a listener thread in each process
+    feeds received messages into the local subscribers.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("CRM_PUBSUB_REDIS_URL requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, topic, maxsize=None) -> Subscriber:
+        self._ensure_listener()
+        return super().subscribe(topic, maxsize)
+
+    def publish(self, topic, message):
+        self._client.publish(REDIS_CHANNEL_PREFIX + topic, json.dumps(message))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='crm-pubsub-redis', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(REDIS_CHANNEL_PREFIX + '*')
+        for item in pubsub.listen():
+            try:
+                topic = item['channel'].decode()[len(REDIS_CHANNEL_PREFIX):]
+                self.deliver(topic, json.loads(item['data']))
+            except Exception:
+                logger.exception("Dropping malformed pub/sub message: %r", item)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = getattr(settings, 'CRM_PUBSUB_REDIS_URL', '')
+                _broker = RedisBroker(url) if url else Broker()
+    return _broker
+
+
+def publish_on_commit(topic, pk):
+    """Announce a row change once the surrounding transaction commits."""
+    transaction.on_commit(lambda: get_broker().publish(topic, {'pk': pk}))
@@ -1,15 +1,24 @@
+import logging
 import re
+from datetime import timedelta
 from decimal import Decimal, InvalidOperation
 from typing import List
 
 import graphene
 from graphene import relay
+from graphql import GraphQLError
+from graphql_relay import from_global_id, to_global_id
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 
-from .models import Customer, Product, Order
+from . import audit, counts
+from .models import BulkJob, ChangeLogEntry, Customer, Product, Order
+from .connections import CountableConnection, CountingConnectionField
+from .projection import project_connection, project_nodes
+from .pubsub import publish_on_commit
+from .tasks import update_product_prices
 from .filters import CustomerFilter as CustomerFilterSet, ProductFilter as ProductFilterSet, OrderFilter as OrderFilterSet
 
 
@@ -20,31 +29,70 @@ class CustomerNode(DjangoObjectType):
     class Meta:
         model = Customer
         interfaces = (relay.Node,)
-        fields = ('id', 'name', 'email', 'phone', 'created_at')
+        connection_class = CountableConnection
+        fields = ('id', 'name', 'email', 'phone', 'created_at', 'last_order_date', 'order_count', 'lifetime_revenue')
 
 
 class ProductNode(DjangoObjectType):
     class Meta:
         model = Product
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         fields = ('id', 'name', 'price', 'stock', 'created_at')
 
 
 class OrderNode(DjangoObjectType):
     totalAmount = graphene.Decimal(source='total_amount')
     orderDate = graphene.DateTime(source='order_date')
+    paidAt = graphene.DateTime(source='paid_at')
     # expose a single product for sample query parity
     product = graphene.Field(lambda: ProductNode)
 
+    # computed field -> model field it reads, see crm.projection
+    projection_sources = {"product": "products"}
+
     class Meta:
         model = Order
         interfaces = (relay.Node,)
-        fields = ('id', 'customer', 'products', 'total_amount', 'order_date', 'created_at')
+        connection_class = CountableConnection
+        fields = ('id', 'customer', 'products', 'total_amount', 'order_date', 'created_at', 'paid_at')
 
     def resolve_product(self, info):
+        if "products" in getattr(self, "_prefetched_objects_cache", {}):
+            return min(self.products.all(), key=lambda p: p.pk, default=None)
         return self.products.first()
 
 
+class BulkJobNode(DjangoObjectType):
+    progress = graphene.Float(description="Share of the input processed, from 0 to 1")
+
+    class Meta:
+        model = BulkJob
+        interfaces = (relay.Node,)
+        fields = (
+            'id', 'kind', 'status', 'total', 'processed', 'products_updated', 'orders_updated',
+            'error', 'created_at', 'started_at', 'finished_at',
+        )
+
+    def resolve_progress(self, info):
+        return self.processed / self.total if self.total else 1.0
+
+
+class ChangeLogEntryType(DjangoObjectType):
+    class Meta:
+        model = ChangeLogEntry
+        fields = ('id', 'model', 'object_id', 'action', 'actor', 'timestamp', 'diff')
+
+
+class ChangeFeed(graphene.ObjectType):
+    entries = graphene.List(graphene.NonNull(ChangeLogEntryType), required=True)
+    cursor = graphene.String(description="Pass back as `since` to continue tailing")
+    has_more = graphene.Boolean(required=True)
+
+
+CHANGE_FEED_MAX_PAGE = 1000
+
+
 # Inputs
 class CreateCustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -58,6 +106,11 @@ class CreateProductInput(graphene.InputObjectType):
     stock = graphene.Int()
 
 
+class ProductPriceInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    price = graphene.Decimal(required=True)
+
+
 class CreateOrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
     product_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
@@ -109,15 +162,16 @@ class CreateCustomer(graphene.Mutation):
         phone = (input.get("phone") or "").strip() or None
 
         if not name:
-            raise graphene.GraphQLError("Name is required")
+            raise GraphQLError("Name is required")
         if not email:
-            raise graphene.GraphQLError("Email is required")
+            raise GraphQLError("Email is required")
         if Customer.objects.filter(email=email).exists():
-            raise graphene.GraphQLError("Email already exists")
+            raise GraphQLError("Email already exists")
         if phone and not validate_phone(phone):
-            raise graphene.GraphQLError("Invalid phone format")
+            raise GraphQLError("Invalid phone format")
 
         customer = Customer.objects.create(name=name, email=email, phone=phone)
+        publish_on_commit("customerCreated", customer.pk)
         return CreateCustomer(customer=customer, message="Customer created successfully")
 
 
@@ -150,6 +204,7 @@ class BulkCreateCustomers(graphene.Mutation):
                         raise ValueError("Invalid phone format")
                     cust = Customer.objects.create(name=name, email=email, phone=phone)
                     created.append(cust)
+                    publish_on_commit("customerCreated", cust.pk)
                 except Exception as e:
                     errors.append(f"Record {idx}: {e}")
         return BulkCreateCustomers(customers=created, errors=errors)
@@ -165,13 +220,63 @@ class CreateProduct(graphene.Mutation):
     def mutate(root, info, input: CreateProductInput):
         name = (input.get("name") or "").strip()
         if not name:
-            raise graphene.GraphQLError("Name is required")
+            raise GraphQLError("Name is required")
         price = parse_positive_decimal(input.get("price"))
         stock = parse_non_negative_int(input.get("stock") or 0)
         product = Product.objects.create(name=name, price=price, stock=stock)
+        publish_on_commit("stockChanged", product.pk)
         return CreateProduct(product=product)
 
 
+class UpdateProductPrices(graphene.Mutation):
+    """Queue a background job applying many price changes; poll it with `bulkJob`."""
+
+    class Arguments:
+        prices = graphene.List(graphene.NonNull(ProductPriceInput), required=True)
+        recompute_orders = graphene.Boolean(default_value=False)
+
+    job = graphene.Field(lambda: BulkJobNode)
+
+    @staticmethod
+    def mutate(root, info, prices, recompute_orders=False):
+        if not prices:
+            raise GraphQLError("At least one price must be given")
+        limit = getattr(settings, "CRM_BULK_PRICE_MAX_ITEMS", 100000)
+        if len(prices) > limit:
+            raise GraphQLError(f"At most {limit} prices per job")
+
+        changes = {}
+        for idx, item in enumerate(prices):
+            try:
+                product_id = int(item.get("product_id"))
+            except (TypeError, ValueError):
+                raise GraphQLError(f"Record {idx}: Invalid product ID")
+            try:
+                changes[product_id] = parse_positive_decimal(item.get("price"))
+            except ValueError as e:
+                raise GraphQLError(f"Record {idx}: {e}")
+
+        with transaction.atomic():
+            job = BulkJob.objects.create(
+                kind="update_product_prices",
+                total=len(changes),
+                payload={"prices": list(changes.items()), "recompute_orders": recompute_orders},
+            )
+            transaction.on_commit(lambda: UpdateProductPrices.enqueue(job))
+        return UpdateProductPrices(job=job)
+
+    @staticmethod
+    def enqueue(job):
+        try:
+            update_product_prices.delay(job.pk)
+        except Exception as e:
+            # the job row is already committed; don't leave it pending forever
+            logging.exception("Could not queue bulk job %s", job.pk)
+            job.status, job.error, job.finished_at = BulkJob.FAILED, f"Could not queue the job: {e}", timezone.now()
+            BulkJob.objects.filter(pk=job.pk).update(status=job.status, error=job.error, finished_at=job.finished_at)
+            raise GraphQLError(f"Could not queue bulk job {to_global_id('BulkJobNode', job.pk)}; it was marked failed")
+
+
 class CreateOrder(graphene.Mutation):
     class Arguments:
         input = CreateOrderInput(required=True)
@@ -184,27 +289,65 @@ class CreateOrder(graphene.Mutation):
         try:
             customer = Customer.objects.get(pk=input.get("customer_id"))
         except Customer.DoesNotExist:
-            raise graphene.GraphQLError("Invalid customer ID")
+            raise GraphQLError("Invalid customer ID")
 
         product_ids = input.get("product_ids") or []
         if not product_ids:
-            raise graphene.GraphQLError("At least one product must be selected")
+            raise GraphQLError("At least one product must be selected")
 
         products = list(Product.objects.filter(pk__in=product_ids))
         missing = set(map(str, product_ids)) - set(map(lambda p: str(p.pk), products))
         if missing:
-            raise graphene.GraphQLError(f"Invalid product ID(s): {', '.join(sorted(missing))}")
+            raise GraphQLError(f"Invalid product ID(s): {', '.join(sorted(missing))}")
 
         order_date = input.get("order_date") or timezone.now()
+        total = sum((p.price for p in products), start=Decimal("0"))
         with transaction.atomic():
-            order = Order.objects.create(customer=customer, order_date=order_date)
+            order = Order.objects.create(customer=customer, order_date=order_date, total_amount=total)
             order.products.set(products)
-            total = sum((p.price for p in products), start=Decimal("0"))
-            order.total_amount = total
-            order.save()
+            Customer.record_order(customer.pk, total, order_date)
+            # the UPDATE bypassed this instance; don't return the pre-order stats
+            customer.refresh_from_db(fields=["order_count", "lifetime_revenue", "last_order_date"])
+            counts.invalidate(Customer)  # record_order is an UPDATE, no post_save
+            publish_on_commit("orderCreated", order.pk)
         return CreateOrder(order=order)
 
 
+class MarkOrdersPaid(graphene.Mutation):
+    """Set `paidAt` on unpaid orders; their totals no longer follow product price changes."""
+
+    class Arguments:
+        order_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+        paid_at = graphene.DateTime()
+
+    orders = graphene.List(lambda: OrderNode)
+    orders_updated = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, order_ids, paid_at=None):
+        if not order_ids:
+            raise GraphQLError("At least one order must be given")
+        pks = set()
+        for idx, order_id in enumerate(order_ids):
+            try:
+                pks.add(int(order_id))
+            except (TypeError, ValueError):
+                raise GraphQLError(f"Record {idx}: Invalid order ID")
+        missing = pks - set(Order.objects.filter(pk__in=pks).values_list("pk", flat=True))
+        if missing:
+            raise GraphQLError(f"Invalid order ID(s): {', '.join(map(str, sorted(missing)))}")
+
+        with transaction.atomic():
+            # already-paid orders keep their original paid_at
+            unpaid = Order.objects.unpaid().filter(pk__in=pks)
+            before = audit.values_by_pk(unpaid, ["paid_at"])
+            orders_updated = unpaid.update(paid_at=paid_at or timezone.now())
+            audit.record_updates(Order, before, audit.values_by_pk(Order.objects.filter(pk__in=before), ["paid_at"]))
+            counts.invalidate(Order)  # UPDATE, no post_save
+        orders = list(orders_queryset().filter(pk__in=pks).order_by("pk"))
+        return MarkOrdersPaid(orders=orders, orders_updated=orders_updated)
+
+
 # Filter inputs for GraphQL
 class CustomerFilterInput(graphene.InputObjectType):
     nameIcontains = graphene.String()
@@ -212,6 +355,9 @@ class CustomerFilterInput(graphene.InputObjectType):
     createdAtGte = graphene.DateTime()
     createdAtLte = graphene.DateTime()
     phonePattern = graphene.String()
+    lastOrderBefore = graphene.DateTime()
+    lifetimeRevenueGte = graphene.Decimal()
+    orderCountGte = graphene.Int()
 
 
 class ProductFilterInput(graphene.InputObjectType):
@@ -232,84 +378,156 @@ class OrderFilterInput(graphene.InputObjectType):
     productId = graphene.ID()
 
 
+# camelCase filter inputs -> FilterSet params (shared by connections and subscriptions)
+def customer_filter_data(filter):  # noqa: A002
+    data = {}
+    if filter:
+        if filter.get("nameIcontains"):
+            data["name"] = filter["nameIcontains"]
+        if filter.get("emailIcontains"):
+            data["email"] = filter["emailIcontains"]
+        if filter.get("createdAtGte"):
+            data["created_at__gte"] = filter["createdAtGte"]
+        if filter.get("createdAtLte"):
+            data["created_at__lte"] = filter["createdAtLte"]
+        if filter.get("phonePattern"):
+            data["phone_pattern"] = filter["phonePattern"]
+        if filter.get("lastOrderBefore"):
+            data["last_order_before"] = filter["lastOrderBefore"]
+        if filter.get("lifetimeRevenueGte") is not None:
+            data["lifetime_revenue__gte"] = filter["lifetimeRevenueGte"]
+        if filter.get("orderCountGte") is not None:
+            data["order_count__gte"] = filter["orderCountGte"]
+    return data
+
+
+def product_filter_data(filter):  # noqa: A002
+    data = {}
+    if filter:
+        if filter.get("nameIcontains"):
+            data["name"] = filter["nameIcontains"]
+        if filter.get("priceGte") is not None:
+            data["price__gte"] = filter["priceGte"]
+        if filter.get("priceLte") is not None:
+            data["price__lte"] = filter["priceLte"]
+        if filter.get("stockGte") is not None:
+            data["stock__gte"] = filter["stockGte"]
+        if filter.get("stockLte") is not None:
+            data["stock__lte"] = filter["stockLte"]
+    return data
+
+
+def order_filter_data(filter):  # noqa: A002
+    data = {}
+    if filter:
+        if filter.get("totalAmountGte") is not None:
+            data["total_amount__gte"] = filter["totalAmountGte"]
+        if filter.get("totalAmountLte") is not None:
+            data["total_amount__lte"] = filter["totalAmountLte"]
+        if filter.get("orderDateGte"):
+            data["order_date__gte"] = filter["orderDateGte"]
+        if filter.get("orderDateLte"):
+            data["order_date__lte"] = filter["orderDateLte"]
+        if filter.get("customerName"):
+            data["customer_name"] = filter["customerName"]
+        if filter.get("productName"):
+            data["product_name"] = filter["productName"]
+        if filter.get("productId"):
+            data["product_id"] = filter["productId"]
+    return data
+
+
+def orders_queryset():
+    return Order.objects.select_related("customer").prefetch_related("products")
+
+
+# Relay type name -> base queryset for node lookups
+NODE_QUERYSETS = {
+    "CustomerNode": lambda: Customer.objects.all(),
+    "ProductNode": lambda: Product.objects.all(),
+    "OrderNode": orders_queryset,
+    "BulkJobNode": lambda: BulkJob.objects.all(),
+}
+
+
+def load_nodes(info, global_ids):
+    """Resolve Relay global IDs with one ``pk__in`` query per node type.
+
+    Results follow the input order; unknown, malformed or missing IDs give None.
+    """
+    keys = []
+    wanted = {}
+    for global_id in global_ids:
+        try:
+            type_name, pk = from_global_id(global_id)
+            key = (type_name, int(pk))
+        except (TypeError, ValueError):
+            key = None
+        if key is not None and key[0] not in NODE_QUERYSETS:
+            key = None
+        keys.append(key)
+        if key is not None:
+            wanted.setdefault(key[0], set()).add(key[1])
+
+    found = {}
+    for type_name, pks in wanted.items():
+        qs = project_nodes(NODE_QUERYSETS[type_name](), info, type_name)
+        for obj in qs.filter(pk__in=pks):
+            found[(type_name, obj.pk)] = obj
+    return [found.get(key) if key is not None else None for key in keys]
+
+
 class CRMQuery:
+    node = graphene.Field(relay.Node, id=graphene.ID(required=True))
+    nodes = graphene.List(relay.Node, required=True, ids=graphene.List(graphene.NonNull(graphene.ID), required=True))
+
     # Filtered Relay connections with custom filter and orderBy args
-    all_customers = DjangoFilterConnectionField(
+    all_customers = CountingConnectionField(
         CustomerNode,
         filterset_class=CustomerFilterSet,
         filter=graphene.Argument(CustomerFilterInput, name="filter"),
-        order_by=graphene.Argument(graphene.String, name="orderBy"),
+        # passed via args: DjangoFilterConnectionField swallows an `order_by` kwarg
+        args={"order_by": graphene.Argument(graphene.String, name="orderBy")},
     )
-    all_products = DjangoFilterConnectionField(
+    all_products = CountingConnectionField(
         ProductNode,
         filterset_class=ProductFilterSet,
         filter=graphene.Argument(ProductFilterInput, name="filter"),
-        order_by=graphene.Argument(graphene.String, name="orderBy"),
+        args={"order_by": graphene.Argument(graphene.String, name="orderBy")},
     )
-    all_orders = DjangoFilterConnectionField(
+    all_orders = CountingConnectionField(
         OrderNode,
         filterset_class=OrderFilterSet,
         filter=graphene.Argument(OrderFilterInput, name="filter"),
-        order_by=graphene.Argument(graphene.String, name="orderBy"),
+        args={"order_by": graphene.Argument(graphene.String, name="orderBy")},
     )
 
+    def resolve_node(root, info, id):  # noqa: A002
+        return load_nodes(info, [id])[0]
+
+    def resolve_nodes(root, info, ids):
+        return load_nodes(info, ids)
+
     # Resolvers mapping camelCase inputs to FilterSet params and applying ordering
     def resolve_all_customers(root, info, filter=None, order_by=None, **kwargs):  # noqa: A002
-        data = {}
-        if filter:
-            if filter.get("nameIcontains"):
-                data["name"] = filter["nameIcontains"]
-            if filter.get("emailIcontains"):
-                data["email"] = filter["emailIcontains"]
-            if filter.get("createdAtGte"):
-                data["created_at__gte"] = filter["createdAtGte"]
-            if filter.get("createdAtLte"):
-                data["created_at__lte"] = filter["createdAtLte"]
-            if filter.get("phonePattern"):
-                data["phone_pattern"] = filter["phonePattern"]
-        qs = CustomerFilterSet(data=data, queryset=Customer.objects.all()).qs
+        data = customer_filter_data(filter)
+        qs = CustomerFilterSet(data=data, queryset=project_connection(Customer.objects.all(), info)).qs
         if order_by:
             order_list = [s.strip() for s in str(order_by).split(',') if s.strip()]
             qs = qs.order_by(*order_list)
         return qs
 
     def resolve_all_products(root, info, filter=None, order_by=None, **kwargs):  # noqa: A002
-        data = {}
-        if filter:
-            if filter.get("nameIcontains"):
-                data["name"] = filter["nameIcontains"]
-            if filter.get("priceGte") is not None:
-                data["price__gte"] = filter["priceGte"]
-            if filter.get("priceLte") is not None:
-                data["price__lte"] = filter["priceLte"]
-            if filter.get("stockGte") is not None:
-                data["stock__gte"] = filter["stockGte"]
-            if filter.get("stockLte") is not None:
-                data["stock__lte"] = filter["stockLte"]
-        qs = ProductFilterSet(data=data, queryset=Product.objects.all()).qs
+        data = product_filter_data(filter)
+        qs = ProductFilterSet(data=data, queryset=project_connection(Product.objects.all(), info)).qs
         if order_by:
             order_list = [s.strip() for s in str(order_by).split(',') if s.strip()]
             qs = qs.order_by(*order_list)
         return qs
 
     def resolve_all_orders(root, info, filter=None, order_by=None, **kwargs):  # noqa: A002
-        data = {}
-        if filter:
-            if filter.get("totalAmountGte") is not None:
-                data["total_amount__gte"] = filter["totalAmountGte"]
-            if filter.get("totalAmountLte") is not None:
-                data["total_amount__lte"] = filter["totalAmountLte"]
-            if filter.get("orderDateGte"):
-                data["order_date__gte"] = filter["orderDateGte"]
-            if filter.get("orderDateLte"):
-                data["order_date__lte"] = filter["orderDateLte"]
-            if filter.get("customerName"):
-                data["customer_name"] = filter["customerName"]
-            if filter.get("productName"):
-                data["product_name"] = filter["productName"]
-            if filter.get("productId"):
-                data["product_id"] = filter["productId"]
-        qs = OrderFilterSet(data=data, queryset=Order.objects.select_related("customer").prefetch_related("products")).qs
+        data = order_filter_data(filter)
+        qs = OrderFilterSet(data=data, queryset=project_connection(orders_queryset(), info)).qs
         if order_by:
             order_list = [s.strip() for s in str(order_by).split(',') if s.strip()]
             qs = qs.order_by(*order_list)
@@ -319,13 +537,75 @@ class CRMQuery:
 class Query(CRMQuery, graphene.ObjectType):
     # keep a simple hello for quick checks
     hello = graphene.String()
+    changes = graphene.Field(
+        ChangeFeed,
+        required=True,
+        since=graphene.String(description="Cursor from a previous page; omit to start at the beginning"),
+        first=graphene.Int(default_value=100),
+    )
+    bulk_job = graphene.Field(BulkJobNode, id=graphene.ID(required=True))
+
+    def resolve_bulk_job(root, info, id):  # noqa: A002
+        job = load_nodes(info, [id])[0]
+        return job if isinstance(job, BulkJob) else None
+
+    def resolve_changes(root, info, since=None, first=100):
+        after_id = 0
+        if since:
+            try:
+                kind, value = from_global_id(since)
+                after_id = int(value)
+            except (TypeError, ValueError):
+                kind = None
+            if kind != "ChangeCursor":
+                raise GraphQLError("Invalid change cursor")
+        first = max(1, min(first, CHANGE_FEED_MAX_PAGE))
+        horizon = timezone.now() - timedelta(seconds=getattr(settings, 'CRM_CHANGE_FEED_SETTLE_SECONDS', 5))
+        rows = list(ChangeLogEntry.objects.filter(pk__gt=after_id).order_by("pk")[:first + 1])
+        # concurrent writers can commit ids out of order: stop at the first entry still inside
+        # the settle window, so a lower id committing late is never behind the cursor
+        settled = next((i for i, row in enumerate(rows) if row.logged_at > horizon), len(rows))
+        entries = rows[:min(first, settled)]
+        last_id = entries[-1].pk if entries else after_id
+        return ChangeFeed(
+            entries=entries,
+            cursor=to_global_id("ChangeCursor", last_id),
+            has_more=len(rows) > len(entries),
+        )
 
     def resolve_hello(root, info):
         return "Hello, GraphQL!"
 
 
+class Subscription(graphene.ObjectType):
+    # Served over WebSocket by crm.subscriptions; the event row is the root value
+    # and events failing the filter are dropped before execution.
+    order_created = graphene.Field(OrderNode, filter=graphene.Argument(OrderFilterInput, name="filter"))
+    stock_changed = graphene.Field(ProductNode, filter=graphene.Argument(ProductFilterInput, name="filter"))
+    customer_created = graphene.Field(CustomerNode, filter=graphene.Argument(CustomerFilterInput, name="filter"))
+
+    def resolve_order_created(root, info, filter=None):  # noqa: A002
+        return root
+
+    def resolve_stock_changed(root, info, filter=None):  # noqa: A002
+        return root
+
+    def resolve_customer_created(root, info, filter=None):  # noqa: A002
+        return root
+
+
+# topic -> (base queryset, FilterSet, filter input mapper) used to load and filter event rows
+SUBSCRIPTION_SOURCES = {
+    "orderCreated": (orders_queryset, OrderFilterSet, order_filter_data),
+    "stockChanged": (lambda: Product.objects.all(), ProductFilterSet, product_filter_data),
+    "customerCreated": (lambda: Customer.objects.all(), CustomerFilterSet, customer_filter_data),
+}
+
+
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    update_product_prices = UpdateProductPrices.Field()
+    mark_orders_paid = MarkOrdersPaid.Field()
@@ -1,6 +1,9 @@
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
+from crm.db_router import sqlite_replica_databases
+
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crm.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -30,6 +34,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'crm.middleware.ReplicaStickinessMiddleware',
+    'crm.middleware.AuditMiddleware',
 ]
 
 ROOT_URLCONF = 'crm.urls'
@@ -51,6 +57,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'crm.wsgi.application'
+ASGI_APPLICATION = 'crm.asgi.application'
 
 DATABASES = {
     'default': {
@@ -59,6 +66,16 @@ DATABASES = {
     }
 }
 
+# Read replicas: local SQLite copies kept in sync by `manage.py replicate_sqlite`
+_REPLICAS = sqlite_replica_databases(BASE_DIR, int(os.environ.get('CRM_SQLITE_REPLICAS', '0')))
+DATABASES.update(_REPLICAS)
+CRM_REPLICA_DATABASES = list(_REPLICAS)
+
+DATABASE_ROUTERS = ['crm.db_router.PrimaryReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it runs a mutation
+CRM_REPLICA_STICKY_SECONDS = int(os.environ.get('CRM_REPLICA_STICKY_SECONDS', '5'))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -68,9 +85,59 @@ STATIC_URL = 'static/'
 
 # Graphene configuration points to our schema entry
 GRAPHENE = {
-    'SCHEMA': 'alx_backend_graphql.schema.schema'
+    'SCHEMA': 'alx_backend_graphql.schema.schema',
+    'MIDDLEWARE': ['crm.middleware.PrimaryForMutationsMiddleware'],
 }
 
+# Query batching on /graphql: max operations per array body, and threads used
+# to run query-only batches in parallel (1 = sequential)
+CRM_GRAPHQL_BATCH_MAX_OPERATIONS = 20
+CRM_GRAPHQL_BATCH_WORKERS = int(os.environ.get('CRM_GRAPHQL_BATCH_WORKERS', '1'))
+
+# Rows fetched (and edges flushed) per chunk in `/graphql?stream=1` responses, and the most
+# edges one streamed response may carry (also the default when `first` is omitted)
+CRM_STREAM_CHUNK_SIZE = 2000
+CRM_STREAM_MAX_EDGES = 100000
+
+# Load only the columns, joins and prefetches a query selects (crm/projection.py)
+CRM_QUERY_PROJECTION = True
+
+# How connections compute `totalCount`: 'exact', 'cached' (TTL + invalidation on writes)
+# or 'estimated' (planner/primary key estimate, exact below CRM_COUNT_EXACT_BELOW). Opt into
+# the last two only with a CACHES backend shared by web workers, Celery and cron jobs:
+# with the default per-process cache, invalidations never leave the process that wrote.
+CRM_COUNT_STRATEGY = 'exact'
+CRM_COUNT_STRATEGIES = {}  # per root field overrides, e.g. {'allOrders': 'estimated'}
+CRM_COUNT_CACHE_TTL = 60
+CRM_COUNT_EXACT_BELOW = 1000
+
+# updateProductPrices: largest accepted input, and rows per transaction in the worker
+CRM_BULK_PRICE_MAX_ITEMS = 100000
+CRM_BULK_CHUNK_SIZE = 1000
+
+# Load testing: `X-DB-Queries` response header, and an optional JSONL file every
+# executed operation is appended to for replay with scripts/replay_traffic.py
+CRM_QUERY_COUNT_HEADER = DEBUG
+CRM_GRAPHQL_TRAFFIC_LOG = os.environ.get('CRM_GRAPHQL_TRAFFIC_LOG', '')
+
+# Idempotency-Key on mutations: how long a stored response is replayed (expired keys are
+# removed by `manage.py purge_idempotency_keys`), how long a retry waits for the original
+# to finish, and after how long an unfinished claim is considered dead and taken over
+CRM_IDEMPOTENCY_TTL_SECONDS = 86400
+CRM_IDEMPOTENCY_WAIT_SECONDS = 10
+CRM_IDEMPOTENCY_LOCK_SECONDS = 60
+
+# Change log entries older than this are removed by `manage.py compact_change_log`
+CRM_CHANGE_LOG_RETENTION_DAYS = 90
+# The `changes` feed holds back entries written less than this long ago, so ids that commit
+# out of order under concurrent writers are never skipped (must exceed insert-to-commit time)
+CRM_CHANGE_FEED_SETTLE_SECONDS = 5
+
+# Subscriptions: per-subscriber queue bound (oldest events are dropped beyond it)
+# and an optional Redis-compatible server relaying events between processes
+CRM_SUBSCRIPTION_QUEUE_SIZE = 100
+CRM_PUBSUB_REDIS_URL = os.environ.get('CRM_PUBSUB_REDIS_URL', '')
+
 # Modern default PK field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
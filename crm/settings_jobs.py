@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+
+from crm.db_router import sqlite_replica_databases
+
+# Lean profile for cron jobs and Celery workers:
+#   DJANGO_SETTINGS_MODULE=crm.settings_jobs
+# Only the ORM is loaded: no admin, sessions, messages, templates, Graphene
+# or Celery app import at setup time.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SECRET_KEY = 'dev-secret-change-me'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'crm',
+]
+
+MIDDLEWARE = []
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
+_REPLICAS = sqlite_replica_databases(BASE_DIR, int(os.environ.get('CRM_SQLITE_REPLICAS', '0')))
+DATABASES.update(_REPLICAS)
+CRM_REPLICA_DATABASES = list(_REPLICAS)
+
+DATABASE_ROUTERS = ['crm.db_router.PrimaryReplicaRouter']
+
+TIME_ZONE = 'UTC'
+USE_I18N = False
+USE_TZ = True
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Job processes bind the Celery app themselves (celery -A crm) or not at all
+CRM_LOAD_CELERY_APP = False
+
+CELERY_BROKER_URL = 'redis://localhost:6379/0'
+
+# Rows per transaction in the bulk price worker (see crm.settings)
+CRM_BULK_CHUNK_SIZE = 1000
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponseBadRequest
+from graphene.utils.str_converters import to_camel_case
+from graphene_django.fields import DjangoConnectionField
+from graphene_django.views import HttpError
+from graphql import ExecutionContext, GraphQLError, OperationType, get_named_type, located_error, parse, validate
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_argument_values
+from graphql.pyutils import Path
+from graphql_relay import cursor_to_offset, offset_to_cursor
+
+from .db_router import restore_routing, routing_state
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, separators=(",", ":"), default=_default).encode()
+
+
+def _bad_request(message):
+    return HttpError(HttpResponseBadRequest(message))
+
+
+class ConnectionStream:
+    """Serialize one root connection field edge by edge.
+
+    The queryset is read with ``iterator(chunk_size=...)`` and each node's
+    selection set is executed as its row arrives, so neither the result dict
+    nor the JSON string for the whole connection is ever held in memory.
+    Validation happens in ``__init__`` so errors can still be answered with a
+    regular 400 before streaming starts.
+
+    Supported shape: ``{ allX(filter, orderBy, first, after, ...) { edges { cursor node { ... } } } }``.
+    """
+
+    def __init__(self, schema, request, query, variables=None, operation_name=None, middleware=None):
+        # the body is sent after the middleware returned; keep reading where the request did
+        self.routing = routing_state()
+        self.chunk_size = getattr(settings, 'CRM_STREAM_CHUNK_SIZE', 2000)
+        graphql_schema = schema.graphql_schema
+
+        try:
+            document = parse(query or "")
+        except GraphQLError as e:
+            raise _bad_request(e.message)
+        errors = validate(graphql_schema, document)
+        if errors:
+            raise _bad_request(errors[0].message)
+
+        exe = ExecutionContext.build(
+            graphql_schema, document, context_value=request, raw_variable_values=variables,
+            operation_name=operation_name, middleware=middleware,
+        )
+        if isinstance(exe, list):
+            raise _bad_request(exe[0].message)
+        if exe.operation.operation != OperationType.QUERY:
+            raise _bad_request("Streaming mode only supports queries.")
+        self.exe = exe
+
+        root_type = graphql_schema.query_type
+        root_fields = collect_fields(
+            graphql_schema, exe.fragments, exe.variable_values, root_type, exe.operation.selection_set
+        )
+        if len(root_fields) != 1:
+            raise _bad_request("Streaming mode supports exactly one root field.")
+        self.response_name, field_nodes = next(iter(root_fields.items()))
+        field_name = field_nodes[0].name.value
+
+        connection_fields = {
+            field.name or to_camel_case(name): (name, field)
+            for name, field in schema.query._meta.fields.items()
+            if isinstance(field, DjangoConnectionField)
+        }
+        if field_name not in connection_fields:
+            raise _bad_request(f"Field '{field_name}' cannot be streamed.")
+        python_name, self.field = connection_fields[field_name]
+        self.resolver = self.field.resolver or getattr(schema.query, f"resolve_{python_name}", None)
+
+        field_def = root_type.fields[field_name]
+        self.path = Path(None, self.response_name, root_type.name)
+        self.info = exe.build_resolve_info(field_def, field_nodes, root_type, self.path)
+        self.args = get_argument_values(field_def, field_nodes[0], exe.variable_values)
+        if self.args.get("last") is not None or self.args.get("before") is not None:
+            raise _bad_request("Streaming mode does not support `last`/`before`.")
+        self.max_edges = getattr(settings, 'CRM_STREAM_MAX_EDGES', 100000)
+        first = self.args.get("first")
+        if first is not None and self.max_edges is not None and first > self.max_edges:
+            raise _bad_request(f"Requesting {first} edges exceeds the streaming limit of {self.max_edges}.")
+
+        # connection { edges { node } } selections
+        self.connection_type = get_named_type(field_def.type)
+        self.connection_fields = exe.collect_subfields(self.connection_type, field_nodes)
+        for key, nodes in self.connection_fields.items():
+            if nodes[0].name.value not in ("edges", "__typename"):
+                raise _bad_request(f"Field '{nodes[0].name.value}' is not available in streaming mode.")
+        self.edge_type = get_named_type(self.connection_type.fields["edges"].type)
+        self.node_type = get_named_type(self.edge_type.fields["node"].type)
+
+    def queryset(self):
+        args = dict(self.args)
+        iterable = self.resolver(None, self.info, **args) if self.resolver else None
+        if iterable is None:
+            iterable = self.field.get_manager()
+        qs = self.field.get_queryset_resolver()(self.field.connection_type, iterable, self.info, args)
+
+        start = 0
+        if args.get("after"):
+            start = cursor_to_offset(args["after"]) + 1
+        if args.get("offset"):
+            start += args["offset"]
+        first = args.get("first")
+        if first is None:
+            first = self.max_edges
+        stop = start + first if first is not None else None
+        return qs[start:stop], start
+
+    def __iter__(self):
+        with restore_routing(self.routing):
+            yield from self._document()
+
+    async def aiter_chunks(self, buffered=4):
+        """Async iteration for ASGI servers.
+
+        Django consumes a sync iterator under ASGI with ``sync_to_async(list)``,
+        i.e. it buffers the whole body. Here the sync document is produced on
+        one worker thread (it owns the queryset cursor and DB connection) and
+        handed over chunk by chunk, at most ``buffered`` chunks ahead of the
+        client.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        room = threading.Semaphore(buffered)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            document = iter(self)
+            try:
+                for chunk in document:
+                    room.acquire()
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as error:
+                loop.call_soon_threadsafe(chunks.put_nowait, error)
+            finally:
+                document.close()
+                connections.close_all()
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+        producer = loop.run_in_executor(None, contextvars.copy_context().run, produce)
+        try:
+            while (chunk := await chunks.get()) is not done:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                room.release()
+                yield chunk
+        finally:
+            # client gone or document finished: let a waiting producer see the stop flag
+            stop.set()
+            room.release()
+            await producer
+
+    def _document(self):
+        yield b'{"data":{' + dumps(self.response_name) + b":{"
+        for i, (key, nodes) in enumerate(self.connection_fields.items()):
+            yield (b"," if i else b"") + dumps(key) + b":"
+            if nodes[0].name.value == "__typename":
+                yield dumps(self.connection_type.name)
+            else:
+                yield from self._edges(key, nodes)
+        yield b"}}"
+        errors = self.exe.collected_errors.errors
+        if errors:
+            yield b',"errors":' + dumps([e.formatted for e in errors])
+        yield b"}"
+
+    def _edges(self, edges_key, edges_nodes):
+        exe = self.exe
+        edge_fields = exe.collect_subfields(self.edge_type, edges_nodes)
+        edges_path = Path(self.path, edges_key, self.connection_type.name)
+
+        yield b"["
+        chunk = []
+        flushed = False
+        try:
+            qs, start = self.queryset()
+            for index, obj in enumerate(qs.iterator(chunk_size=self.chunk_size)):
+                edge_path = Path(edges_path, index, None)
+                edge = {}
+                for key, nodes in edge_fields.items():
+                    name = nodes[0].name.value
+                    if name == "cursor":
+                        edge[key] = offset_to_cursor(start + index)
+                    elif name == "__typename":
+                        edge[key] = self.edge_type.name
+                    else:
+                        node_path = Path(edge_path, key, self.edge_type.name)
+                        node_fields = exe.collect_subfields(self.node_type, nodes)
+                        try:
+                            edge[key] = exe.execute_fields(self.node_type, obj, node_path, node_fields)
+                        except GraphQLError as error:
+                            exe.collected_errors.add(error, node_path)
+                            edge[key] = None
+                chunk.append(dumps(edge))
+                if len(chunk) >= self.chunk_size:
+                    yield (b"," if flushed else b"") + b",".join(chunk)
+                    chunk, flushed = [], True
+        except Exception as error:
+            # the 200 status is already sent: end the edges early and report it in `errors`
+            logger.exception("Streaming %s failed", self.response_name)
+            exe.collected_errors.add(located_error(error, edges_nodes, edges_path.as_list()), edges_path)
+        if chunk:
+            yield (b"," if flushed else b"") + b",".join(chunk)
+        yield b"]"
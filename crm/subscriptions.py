@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from graphene_django.settings import graphene_settings
+from graphql import ExecutionContext, GraphQLError, OperationType, execute, parse, validate
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_argument_values
+
+from .db_router import pin_primary
+from .pubsub import Subscriber, get_broker
+from .schema import SUBSCRIPTION_SOURCES
+
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL = 'graphql-transport-ws'
+
+
+class SubscriptionGroup:
+    """All subscribers of one (document, variables) pair.
+
+    Each event is loaded, filtered and executed once per group, then the
+    encoded payload is offered to every member's bounded queue. A thousand
+    dashboards running the same subscription cost one execution per event.
+    The group's own upstream queue is unbounded: only a slow member's queue
+    sheds events, never the feed every member shares.
+    """
+
+    def __init__(self, hub, key, document, operation_name, variables, topic, filter_value):
+        self.hub = hub
+        self.key = key
+        self.document = document
+        self.operation_name = operation_name
+        self.variables = variables
+        self.topic = topic
+        self.filter_value = filter_value
+        self.members = set()
+        self.source = hub.broker.subscribe(topic, maxsize=0)  # 0: unbounded
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        execute_event = sync_to_async(self._execute, thread_sensitive=False)
+        while True:
+            message = await self.source.get()
+            try:
+                payload = await execute_event(message['pk'])
+            except Exception:
+                logger.exception("Subscription %s failed for event %r", self.topic, message)
+                continue
+            if payload is None:
+                continue
+            for member in list(self.members):
+                member.offer(payload)
+
+    def _execute(self, pk):
+        close_old_connections()
+        base_queryset, filterset_class, to_filter_data = SUBSCRIPTION_SOURCES[self.topic]
+        # events are published on commit; a replica may not have the row yet
+        with pin_primary():
+            qs = filterset_class(data=to_filter_data(self.filter_value), queryset=base_queryset().filter(pk=pk)).qs
+            row = qs.first()
+            if row is None:
+                return None  # filtered out or gone
+            result = execute(
+                self.hub.schema.graphql_schema, self.document, root_value=row, context_value=SimpleNamespace(),
+                variable_values=self.variables, operation_name=self.operation_name,
+            )
+        return json.dumps(result.formatted, separators=(',', ':'))
+
+    def close(self):
+        self.task.cancel()
+        self.hub.broker.unsubscribe(self.topic, self.source)
+
+
+class SubscriptionHub:
+    def __init__(self, schema=None, broker=None):
+        self.schema = schema or graphene_settings.SCHEMA
+        self.broker = broker or get_broker()
+        self.groups = {}
+
+    def subscribe(self, query, variables=None, operation_name=None):
+        """Join the group for this operation. Returns ``(group, subscriber)``.
+
+        Raises ``GraphQLError`` if the document is not a valid single-field
+        subscription.
+        """
+        key = (query, operation_name, json.dumps(variables or {}, sort_keys=True, default=str))
+        group = self.groups.get(key)
+        if group is None:
+            group = self._create_group(key, query, variables, operation_name)
+            self.groups[key] = group
+        subscriber = Subscriber()
+        group.members.add(subscriber)
+        return group, subscriber
+
+    def unsubscribe(self, group, subscriber):
+        group.members.discard(subscriber)
+        if not group.members and self.groups.get(group.key) is group:
+            del self.groups[group.key]
+            group.close()
+
+    def _create_group(self, key, query, variables, operation_name):
+        graphql_schema = self.schema.graphql_schema
+        document = parse(query or "")
+        errors = validate(graphql_schema, document)
+        if errors:
+            raise errors[0]
+        exe = ExecutionContext.build(
+            graphql_schema, document, raw_variable_values=variables, operation_name=operation_name
+        )
+        if isinstance(exe, list):
+            raise exe[0]
+        if exe.operation.operation != OperationType.SUBSCRIPTION:
+            raise GraphQLError("Only subscription operations are served over WebSocket.")
+
+        root_type = graphql_schema.subscription_type
+        root_fields = collect_fields(
+            graphql_schema, exe.fragments, exe.variable_values, root_type, exe.operation.selection_set
+        )
+        if len(root_fields) != 1:
+            raise GraphQLError("Subscriptions must select exactly one root field.")
+        field_nodes = next(iter(root_fields.values()))
+        topic = field_nodes[0].name.value
+        if topic not in SUBSCRIPTION_SOURCES:
+            raise GraphQLError(f"Unknown subscription '{topic}'.")
+        args = get_argument_values(root_type.fields[topic], field_nodes[0], exe.variable_values)
+        return SubscriptionGroup(self, key, document, operation_name, variables, topic, args.get('filter'))
+
+
+_hub = None
+
+
+def get_hub() -> SubscriptionHub:
+    global _hub
+    if _hub is None:
+        _hub = SubscriptionHub()
+    return _hub
+
+
+class GraphQLWebSocketApp:
+    """ASGI app speaking the ``graphql-transport-ws`` protocol."""
+
+    def __init__(self, hub=None):
+        self._hub = hub
+
+    @property
+    def hub(self):
+        return self._hub or get_hub()
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in scope.get('subprotocols', []):
+            await send({'type': 'websocket.close', 'code': 4406})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+        await _Connection(self.hub, send).run(receive)
+
+
+class _Connection:
+    def __init__(self, hub, send):
+        self.hub = hub
+        self.send = send
+        self.acknowledged = False
+        self.operations = {}  # id -> (group, subscriber, forwarding task)
+
+    async def run(self, receive):
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    return
+                if message['type'] != 'websocket.receive':
+                    continue
+                try:
+                    data = json.loads(message.get('text') or message.get('bytes') or '')
+                    kind = data['type']
+                except (ValueError, KeyError, TypeError):
+                    await self.close(4400, "Invalid message")
+                    return
+                if not await self.handle(kind, data):
+                    return
+        finally:
+            for op_id in list(self.operations):
+                self.stop(op_id)
+
+    async def handle(self, kind, data):
+        if kind == 'connection_init':
+            if self.acknowledged:
+                await self.close(4429, "Too many initialisation requests")
+                return False
+            self.acknowledged = True
+            await self.send_json({'type': 'connection_ack'})
+        elif kind == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif not self.acknowledged:
+            await self.close(4401, "Unauthorized")
+            return False
+        elif kind == 'subscribe':
+            op_id = data.get('id')
+            if op_id in self.operations:
+                await self.close(4409, f"Subscriber for {op_id} already exists")
+                return False
+            payload = data.get('payload') or {}
+            try:
+                group, subscriber = self.hub.subscribe(
+                    payload.get('query'), payload.get('variables'), payload.get('operationName')
+                )
+            except GraphQLError as e:
+                await self.send_json({'type': 'error', 'id': op_id, 'payload': [e.formatted]})
+                return True
+            task = asyncio.create_task(self.forward(op_id, subscriber))
+            self.operations[op_id] = (group, subscriber, task)
+        elif kind == 'complete':
+            self.stop(data.get('id'))
+        else:
+            await self.close(4400, f"Unexpected message type '{kind}'")
+            return False
+        return True
+
+    async def forward(self, op_id, subscriber):
+        prefix = '{"type":"next","id":' + json.dumps(op_id) + ',"payload":'
+        while True:
+            payload = await subscriber.get()
+            # a slow socket blocks here; the bounded queue sheds the backlog
+            await self.send({'type': 'websocket.send', 'text': prefix + payload + '}'})
+
+    def stop(self, op_id):
+        entry = self.operations.pop(op_id, None)
+        if entry is None:
+            return
+        group, subscriber, task = entry
+        task.cancel()
+        self.hub.unsubscribe(group, subscriber)
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def close(self, code, reason):
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
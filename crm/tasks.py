@@ -1,16 +1,28 @@
 import json
 import logging
 from datetime import datetime
+from decimal import Decimal
 
-import requests
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import audit, counts
+from .db_router import pin_primary
+from .models import BulkJob, ChangeLogEntry, Customer, Order, Product
 
 
 GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
+CUSTOMER_STATS_FIELDS = ["order_count", "lifetime_revenue", "last_order_date"]
 LOG_PATH = "/tmp/crm_report_log.txt"
 
 
 def _fetch_counts():
+    # imported here so worker startup doesn't pay for requests/urllib3
+    import requests
+
     query = {
         "query": (
             "query {\n"
@@ -51,3 +63,70 @@ def generate_crm_report():
     except Exception as e:
         logging.exception("Failed to write CRM report log: %s", e)
     return line
+
+
+def _apply_price_chunk(prices, recompute_orders):
+    """Update one chunk of prices (and the unpaid orders containing them) in one transaction."""
+    with audit.collect(), transaction.atomic():
+        products = list(Product.objects.filter(pk__in=list(prices)).only("pk", "price").select_for_update())
+        changed = []
+        for product in products:
+            price = prices[product.pk]
+            if product.price != price:
+                audit.record(product, ChangeLogEntry.UPDATE, {"price": [product.price, price]})
+                product.price = price
+                changed.append(product)
+        Product.objects.bulk_update(changed, ["price"])
+
+        orders_updated = 0
+        if recompute_orders and changed:
+            # driven from the product side of the M2M index, not by scanning unpaid orders
+            lines = Order.products.through.objects.filter(product__in=[p.pk for p in changed])
+            affected = Order.objects.unpaid().filter(pk__in=lines.values("order"))
+            before = audit.values_by_pk(affected, ["total_amount"])
+            orders_updated = affected.recompute_totals()
+            audit.record_updates(Order, before, audit.values_by_pk(affected, ["total_amount"]))
+            if orders_updated:
+                # lifetime_revenue sums order totals
+                customers = Customer.objects.filter(pk__in=affected.values("customer"))
+                before = audit.values_by_pk(customers, CUSTOMER_STATS_FIELDS)
+                customers.rebuild_order_stats()
+                audit.record_updates(Customer, before, audit.values_by_pk(customers, CUSTOMER_STATS_FIELDS))
+    return len(changed), orders_updated
+
+
+@shared_task(name="crm.tasks.update_product_prices")
+def update_product_prices(job_id):
+    """Apply a ``BulkJob`` of product prices in chunks, recording progress on the job."""
+    chunk_size = getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+
+    # the job row was just written to the primary; a replica may not have it yet
+    with pin_primary(), audit.actor(f"job:update_product_prices:{job_id}"):
+        try:
+            job = BulkJob.objects.get(pk=job_id)
+            prices = {int(pk): Decimal(price) for pk, price in job.payload["prices"]}
+            recompute_orders = job.payload.get("recompute_orders", False)
+            product_ids = sorted(prices)
+            BulkJob.objects.filter(pk=job_id).update(status=BulkJob.RUNNING, started_at=timezone.now())
+            for start in range(0, len(product_ids), chunk_size):
+                chunk = product_ids[start:start + chunk_size]
+                products_updated, orders_updated = _apply_price_chunk(
+                    {pk: prices[pk] for pk in chunk}, recompute_orders
+                )
+                BulkJob.objects.filter(pk=job_id).update(
+                    processed=F("processed") + len(chunk),
+                    products_updated=F("products_updated") + products_updated,
+                    orders_updated=F("orders_updated") + orders_updated,
+                )
+        except Exception as e:
+            logging.exception("Bulk price job %s failed", job_id)
+            BulkJob.objects.filter(pk=job_id).update(
+                status=BulkJob.FAILED, error=str(e), finished_at=timezone.now()
+            )
+            raise
+        finally:
+            # bulk_update/update() send no signals
+            counts.invalidate(Product)
+            counts.invalidate(Order)
+            counts.invalidate(Customer)
+    BulkJob.objects.filter(pk=job_id).update(status=BulkJob.SUCCEEDED, finished_at=timezone.now())
@@ -0,0 +1,93 @@
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from crm import audit
+from crm.models import ChangeLogEntry, Customer
+
+
+class ChangeLogTransactionTests(TransactionTestCase):
+    # real commits: entries are only written from on_commit callbacks
+
+    def test_rolled_back_savepoint_leaves_no_entry(self):
+        with transaction.atomic():
+            kept = Customer.objects.create(name="Kept", email="kept@example.com")
+            try:
+                with transaction.atomic():
+                    dropped = Customer.objects.create(name="Dropped", email="dropped@example.com")
+                    kept.name = "Renamed"
+                    kept.save()
+                    raise RuntimeError("roll back the savepoint")
+            except RuntimeError:
+                pass
+
+        entries = list(ChangeLogEntry.objects.values_list('object_id', 'action'))
+        self.assertEqual(entries, [(str(kept.pk), ChangeLogEntry.CREATE)])
+        self.assertFalse(ChangeLogEntry.objects.filter(object_id=str(dropped.pk)).exists())
+        self.assertEqual(ChangeLogEntry.objects.get().diff['name'], "Kept")
+
+    def test_rolled_back_transaction_leaves_no_entry(self):
+        try:
+            with transaction.atomic():
+                Customer.objects.create(name="Gone", email="gone@example.com")
+                raise RuntimeError("roll back")
+        except RuntimeError:
+            pass
+        self.assertFalse(ChangeLogEntry.objects.exists())
+
+    def test_changes_after_create_fold_into_it(self):
+        with audit.request_scope('tester'):
+            with transaction.atomic():
+                customer = Customer.objects.create(name="New", email="new@example.com")
+                customer.name = "Renamed"
+                customer.save()
+                with transaction.atomic():
+                    customer.phone = "+1234567890"
+                    customer.save()
+
+        entry = ChangeLogEntry.objects.get()
+        self.assertEqual(entry.action, ChangeLogEntry.CREATE)
+        self.assertEqual((entry.diff['name'], entry.diff['phone']), ("Renamed", "+1234567890"))
+
+    def test_request_scope_writes_on_exit(self):
+        with audit.request_scope('tester'):
+            Customer.objects.create(name="Scoped", email="scoped@example.com")
+            self.assertFalse(ChangeLogEntry.objects.exists())
+        self.assertEqual(ChangeLogEntry.objects.get().actor, 'tester')
+
+
+QUERY = 'query($since: String) { changes(since: $since, first: 10) { entries { objectId } cursor hasMore } }'
+
+
+@override_settings(CRM_CHANGE_FEED_SETTLE_SECONDS=5)
+class ChangeFeedTests(TransactionTestCase):
+
+    def changes(self, since=None):
+        response = self.client.post(
+            "/graphql", data=json.dumps({"query": QUERY, "variables": {"since": since}}),
+            content_type="application/json",
+        )
+        return json.loads(response.content)["data"]["changes"]
+
+    def log(self, object_id, logged_ago):
+        return ChangeLogEntry.objects.create(
+            model='customer', object_id=object_id, action=ChangeLogEntry.CREATE,
+            logged_at=timezone.now() - timedelta(seconds=logged_ago),
+        )
+
+    def test_feed_stops_at_first_unsettled_entry(self):
+        self.log('1', 60)
+        self.log('2', 0)   # may still have a lower id committing behind it
+        self.log('3', 60)
+
+        page = self.changes()
+        self.assertEqual([e['objectId'] for e in page['entries']], ['1'])
+        self.assertTrue(page['hasMore'])
+
+        ChangeLogEntry.objects.filter(object_id='2').update(logged_at=timezone.now() - timedelta(seconds=60))
+        page = self.changes(page['cursor'])
+        self.assertEqual([e['objectId'] for e in page['entries']], ['2', '3'])
+        self.assertFalse(page['hasMore'])
@@ -0,0 +1,49 @@
+"""Concurrent retries sharing one Idempotency-Key (see scripts/bench_retry_storm.py)."""
+import importlib.util
+import json
+import os
+from decimal import Decimal
+
+from django.test import TransactionTestCase
+
+from crm.models import Customer, Order, Product
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_spec = importlib.util.spec_from_file_location(
+    "bench_retry_storm", os.path.join(PROJECT_ROOT, "scripts", "bench_retry_storm.py")
+)
+bench_retry_storm = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_retry_storm)
+
+RETRIES = 8
+
+
+class RetryStormTests(TransactionTestCase):
+    # real commits: duplicates run on their own threads and connections
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Storm", email="storm@example.com")
+        self.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=Decimal("9.99"), stock=100) for i in range(2)
+        )
+
+    def payload(self, products):
+        return json.dumps({"query": bench_retry_storm.CREATE_ORDER, "variables": {
+            "input": {"customerId": self.customer.pk, "productIds": [p.pk for p in products]},
+        }})
+
+    def test_concurrent_duplicates_execute_once(self):
+        send = bench_retry_storm.in_process_sender()
+        results = bench_retry_storm.storm(send, {"order-1": self.payload(self.products[:1])}, RETRIES, RETRIES)
+
+        failures, errored = bench_retry_storm.check("createOrder", results)
+        self.assertEqual(failures, [])  # one execution, every copy got the same response
+        self.assertEqual(errored, [])
+        self.assertEqual(len(results["order-1"]), RETRIES)
+        self.assertEqual(Order.objects.count(), 1)
+
+        status, body, replayed = send(self.payload(self.products), "order-1")
+        self.assertEqual(status, 422, body)
+        self.assertIsNone(replayed)
+        self.assertEqual(Order.objects.count(), 1)
@@ -0,0 +1,38 @@
+"""Import-time budget of the lean job profiles (see scripts/bench_importtime.py)."""
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_spec = importlib.util.spec_from_file_location(
+    "bench_importtime", os.path.join(PROJECT_ROOT, "scripts", "bench_importtime.py")
+)
+bench_importtime = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_importtime)
+
+LEAN_PROFILES = [profile for profile in bench_importtime.PROFILES if profile[3] is not None]
+
+# web-only dependencies a job process must never load
+HEAVY_MODULES = ("graphene", "graphene_django", "django_filters", "gql", "requests")
+
+
+@pytest.mark.parametrize("label, settings_module, snippet, budget_ms", LEAN_PROFILES, ids=[p[0] for p in LEAN_PROFILES])
+def test_lean_profile_stays_under_budget(label, settings_module, snippet, budget_ms):
+    # best of three: one cold run on a busy machine is not a regression
+    best_ms = min(bench_importtime.measure(settings_module, snippet)[0] for _ in range(3))
+    assert best_ms <= budget_ms, f"{label} imports in {best_ms:.0f} ms, budget {budget_ms} ms"
+
+
+@pytest.mark.parametrize("label, settings_module, snippet, budget_ms", LEAN_PROFILES, ids=[p[0] for p in LEAN_PROFILES])
+def test_lean_profile_skips_web_dependencies(label, settings_module, snippet, budget_ms):
+    check = f"{snippet}; import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-c", check], cwd=PROJECT_ROOT,
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module), capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "", f"{label} imported {proc.stdout.strip()}"
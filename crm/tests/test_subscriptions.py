@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import Client, TransactionTestCase, override_settings
+
+from crm.subscriptions import SubscriptionHub
+
+BULK_CREATE = 'mutation($input: [CreateCustomerInput!]!) { bulkCreateCustomers(input: $input) { errors } }'
+CREATE = 'mutation($input: CreateCustomerInput!) { createCustomer(input: $input) { customer { id } } }'
+
+
+@override_settings(CRM_SUBSCRIPTION_QUEUE_SIZE=10)
+class CustomerCreatedTests(TransactionTestCase):
+
+    def post(self, query, variables):
+        response = Client().post(
+            "/graphql", data=json.dumps({"query": query, "variables": variables}), content_type="application/json"
+        )
+        body = json.loads(response.content)
+        self.assertNotIn("errors", body)
+        return body
+
+    def receive(self, mutate, expected):
+        """Subscribe, run ``mutate`` on a worker thread and collect ``expected`` events."""
+        async def run():
+            hub = SubscriptionHub()  # mutations publish through get_broker()
+            group, subscriber = hub.subscribe("subscription { customerCreated { email } }")
+            try:
+                await sync_to_async(mutate, thread_sensitive=False)()
+                # a consumer that keeps up: read as fast as events arrive
+                return [json.loads(await asyncio.wait_for(subscriber.get(), 5)) for _ in range(expected)]
+            finally:
+                hub.unsubscribe(group, subscriber)
+        return asyncio.run(run())
+
+    def test_burst_larger_than_queue_reaches_consumer(self):
+        customers = [{"name": f"Burst {i}", "email": f"burst{i}@example.com"} for i in range(50)]
+        events = self.receive(lambda: self.post(BULK_CREATE, {"input": customers}), len(customers))
+        self.assertEqual(
+            sorted(e["data"]["customerCreated"]["email"] for e in events),
+            sorted(c["email"] for c in customers),
+        )
+
+    def test_create_customer_publishes(self):
+        events = self.receive(
+            lambda: self.post(CREATE, {"input": {"name": "Single", "email": "single@example.com"}}), 1
+        )
+        self.assertEqual(events[0]["data"]["customerCreated"]["email"], "single@example.com")
@@ -1,11 +1,12 @@
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from .views import CRMGraphQLView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql', csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
     # Support trailing slash variant as well
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
 ]
@@ -0,0 +1,156 @@
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from graphene_django.views import GraphQLView, HttpError
+from graphql import OperationType, get_operation_ast, parse
+
+from . import idempotency
+from .streaming import ConnectionStream
+
+
+_traffic_log_lock = threading.Lock()
+
+
+def record_operation(path, query, variables, operation_name):
+    """Append one executed operation to the JSONL traffic log."""
+    line = json.dumps(
+        {"ts": time.time(), "operationName": operation_name, "query": query, "variables": variables},
+        default=str,
+    )
+    with _traffic_log_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView that also accepts a JSON array of operations.
+
+    A single-object body behaves exactly like ``GraphQLView``. An array body
+    is executed as a batch: every operation runs against the same request,
+    each result carries its own ``status`` and ``errors``, and the batch
+    itself answers 200. Query-only batches run on
+    ``CRM_GRAPHQL_BATCH_WORKERS`` threads; batches with a mutation run in order.
+
+    ``?stream=1`` opts a single connection query into a streamed response
+    (see ``crm.streaming.ConnectionStream``). With ``CRM_GRAPHQL_TRAFFIC_LOG``
+    set, every executed operation is appended to that file for replay.
+
+    A POST carrying a mutation and an ``Idempotency-Key`` header runs once per
+    key; retries get the stored response (see ``crm.idempotency``).
+    """
+
+    @method_decorator(ensure_csrf_cookie)
+    def dispatch(self, request, *args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if key and request.method == "POST" and self._has_mutation(request):
+            return idempotency.handle(request, key, lambda: self._dispatch(request, *args, **kwargs))
+        return self._dispatch(request, *args, **kwargs)
+
+    def _dispatch(self, request, *args, **kwargs):
+        if request.GET.get("stream") in ("1", "true"):
+            return self._stream(request)
+        if not self._is_batch_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.batch = True
+        try:
+            data = self.parse_body(request)
+            limit = getattr(settings, 'CRM_GRAPHQL_BATCH_MAX_OPERATIONS', 20)
+            if len(data) > limit:
+                raise HttpError(HttpResponseBadRequest(f"Batch exceeds {limit} operations."))
+            responses = self._execute_batch(request, data)
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+        result = "[{}]".format(",".join(body for body, _ in responses))
+        return HttpResponse(status=200, content=result, content_type="application/json")
+
+    def _stream(self, request):
+        try:
+            data = self.parse_body(request)
+            if not isinstance(data, dict):
+                raise HttpError(HttpResponseBadRequest("Streaming mode takes a single operation."))
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            stream = ConnectionStream(
+                self.schema, request, query, variables, operation_name, self.get_middleware(request)
+            )
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+        # under ASGI a sync iterator would be buffered whole; WSGI needs the sync one
+        content = stream.aiter_chunks() if isinstance(request, ASGIRequest) else stream
+        return StreamingHttpResponse(content, content_type="application/json")
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        traffic_log = getattr(settings, 'CRM_GRAPHQL_TRAFFIC_LOG', '')
+        if traffic_log and query and not show_graphiql:
+            record_operation(traffic_log, query, variables, operation_name)
+        return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+
+    def get_response(self, request, data, show_graphiql=False):
+        if not self.batch:
+            return super().get_response(request, data, show_graphiql)
+        # one bad entry must not fail its siblings
+        entry_id = data.get("id") if isinstance(data, dict) else None
+        try:
+            if not isinstance(data, dict):
+                raise HttpError(HttpResponseBadRequest("Batch entries must be JSON objects."))
+            return super().get_response(request, data, show_graphiql)
+        except HttpError as e:
+            status_code = e.response.status_code
+            body = {"errors": [self.format_error(e)], "id": entry_id, "status": status_code}
+            return self.json_encode(request, body), status_code
+
+    def _execute_batch(self, request, data):
+        workers = min(getattr(settings, 'CRM_GRAPHQL_BATCH_WORKERS', 1), len(data))
+        if workers <= 1 or not all(self._is_query(entry) for entry in data):
+            return [self.get_response(request, entry) for entry in data]
+
+        def run(entry):
+            try:
+                return self.get_response(request, entry)
+            finally:
+                # worker threads open their own connections
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, run, entry) for entry in data]
+            return [f.result() for f in futures]
+
+    @staticmethod
+    def _is_batch_request(request):
+        if request.method != "POST" or request.content_type != "application/json":
+            return False
+        return request.body.lstrip()[:1] == b"["
+
+    def _has_mutation(self, request):
+        try:
+            data = json.loads(request.body) if self._is_batch_request(request) else self.parse_body(request)
+        except (HttpError, ValueError):
+            return False  # left for the normal path to reject
+        if isinstance(data, list):
+            return not all(self._is_query(entry) for entry in data)
+        return isinstance(data, dict) and not self._is_query({**request.GET.dict(), **data})
+
+    @staticmethod
+    def _is_query(entry):
+        if not isinstance(entry, dict):
+            return False
+        try:
+            operation = get_operation_ast(parse(entry.get("query") or ""), entry.get("operationName"))
+        except Exception:
+            return False
+        return operation is not None and operation.operation == OperationType.QUERY
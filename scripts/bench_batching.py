@@ -0,0 +1,96 @@
+"""Compare a dashboard load sent as N requests vs one batched request.
+
+In-process (Django test client) by default; ``--rtt-ms`` adds a simulated
+network round trip per HTTP request. Pass ``--url`` to hit a running server.
+
+    python scripts/bench_batching.py --rtt-ms 20 --repeat 50
+    python scripts/bench_batching.py --url http://localhost:8000/graphql
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+# A typical dashboard: recent orders, low stock, newest customers, a ping
+DASHBOARD = [
+    {"query": "{ allOrders(first: 20) "
+              "{ edges { node { id orderDate totalAmount customer { email } } } } }"},
+    {"query": "{ allProducts(first: 20, filter: {stockLte: 10}) { edges { node { id name stock } } } }"},
+    {"query": "{ allCustomers(first: 20) { edges { node { id name email } } } }"},
+    {"query": "{ hello }"},
+]
+
+
+def make_poster(url):
+    if url:
+        import requests
+
+        session = requests.Session()
+
+        def post(payload):
+            resp = session.post(url, data=json.dumps(payload), headers={"Content-Type": "application/json"})
+            return resp.status_code
+        return post
+
+    import django
+    django.setup()
+    from django.test import Client
+
+    client = Client()
+
+    def post(payload):
+        resp = client.post("/graphql", data=json.dumps(payload), content_type="application/json")
+        return resp.status_code
+    return post
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="GraphQL endpoint of a running server")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Simulated round trip per request")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    post = make_poster(args.url)
+
+    def send(payload):
+        if args.rtt_ms:
+            time.sleep(args.rtt_ms / 1000.0)
+        status = post(payload)
+        if status != 200:
+            raise SystemExit(f"Request failed with HTTP {status}")
+
+    def separate():
+        for op in DASHBOARD:
+            send(op)
+
+    def batched():
+        send(DASHBOARD)
+
+    separate()  # warm up
+    seq_median, seq_max = timed(separate, args.repeat)
+    batch_median, batch_max = timed(batched, args.repeat)
+    print(f"{len(DASHBOARD)} separate requests: median {seq_median:.1f} ms, max {seq_max:.1f} ms")
+    print(f"1 batched request:      median {batch_median:.1f} ms, max {batch_max:.1f} ms")
+    print(f"Gain: {seq_median - batch_median:.1f} ms ({(1 - batch_median / seq_median) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Throughput of the bulk price job against row-by-row saves.
+
+Seeds a scratch SQLite database with products and orders (a share of them
+paid), then runs ``crm.tasks.update_product_prices`` inline on every product
+and, for comparison, the row-by-row path (``save()`` per product plus
+``Order.compute_total`` per affected unpaid order) on a sample:
+
+    python scripts/bench_bulk_prices.py --products 100000 --orders 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings_jobs")
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+
+def seed(products, orders, paid_share):
+    from decimal import Decimal
+
+    from django.core.management import call_command
+    from django.db import transaction
+    from django.utils import timezone
+
+    from crm.models import Customer, Order, Product
+
+    call_command("migrate", verbosity=0)
+    if Product.objects.count() >= products:
+        return
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"c{i}@example.com") for i in range(1000)
+        )
+        items = Product.objects.bulk_create(
+            (Product(name=f"Product {i}", price=Decimal("10.00"), stock=100) for i in range(products)),
+            batch_size=5000,
+        )
+        paid_every = round(1 / paid_share) if paid_share else 0
+        rows = Order.objects.bulk_create(
+            (Order(customer=customers[i % len(customers)], total_amount=Decimal("30.00"),
+                   paid_at=timezone.now() if paid_every and i % paid_every == 0 else None)
+             for i in range(orders)),
+            batch_size=5000,
+        )
+        Order.products.through.objects.bulk_create(
+            (Order.products.through(order_id=o.pk, product_id=items[(i * 3 + k) % len(items)].pk)
+             for i, o in enumerate(rows) for k in range(3)),
+            batch_size=5000,
+        )
+
+
+def new_prices(product_ids, round_no):
+    from decimal import Decimal
+
+    return [(pk, Decimal(10 + round_no) + Decimal(pk % 100) / 100) for pk in product_ids]
+
+
+def bulk(product_ids, round_no):
+    from crm.models import BulkJob
+    from crm.tasks import update_product_prices
+
+    prices = new_prices(product_ids, round_no)
+    job = BulkJob.objects.create(
+        kind="update_product_prices", total=len(prices),
+        payload={"prices": prices, "recompute_orders": True},
+    )
+    start = time.perf_counter()
+    update_product_prices(job.pk)  # inline, as a worker would run it
+    elapsed = time.perf_counter() - start
+    job.refresh_from_db()
+    return elapsed, job
+
+
+def row_by_row(product_ids, round_no):
+    from crm.models import Order, Product
+
+    start = time.perf_counter()
+    for pk, price in new_prices(product_ids, round_no):
+        product = Product.objects.get(pk=pk)
+        product.price = price
+        product.save()
+        for order in Order.objects.unpaid().filter(products=product):
+            order.compute_total()
+            order.save()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--paid-share", type=float, default=0.5, help="Share of orders already paid")
+    parser.add_argument("--sample", type=int, default=1000, help="Products updated row by row")
+    parser.add_argument("--db", default="/tmp/crm_bench_bulk_prices.sqlite3")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    seed(args.products, args.orders, args.paid_share)
+
+    from django.conf import settings
+
+    from crm.models import Product
+
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True)[:args.products])
+    round_no = int(time.time()) % 50  # always a real change on re-runs
+
+    elapsed, job = bulk(product_ids, round_no)
+    print(f"bulk job:   {len(product_ids):>7} products in {elapsed:6.2f}s "
+          f"({len(product_ids) / elapsed:>8.0f}/s, chunk {settings.CRM_BULK_CHUNK_SIZE}), "
+          f"{job.products_updated} changed, {job.orders_updated} unpaid orders recomputed")
+
+    sample = product_ids[:args.sample]
+    elapsed = row_by_row(sample, round_no + 1)
+    print(f"row by row: {len(sample):>7} products in {elapsed:6.2f}s ({len(sample) / elapsed:>8.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""totalCount latency per count strategy as the orders table grows.
+
+Grows a scratch SQLite database step by step and, at each size, times a
+filtered ``allOrders { totalCount }`` (a COUNT(DISTINCT) over the M2M join
+when counted exactly) under every strategy:
+
+    python scripts/bench_counts.py --sizes 10000 50000 200000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+QUERY = '{ allOrders(filter: {productName: "Product 1"}) { totalCount isCountExact } }'
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+
+def grow(orders):
+    """Top the orders table up to ``orders`` rows."""
+    from decimal import Decimal
+
+    from django.core.management import call_command
+    from django.db import transaction
+
+    from crm.models import Customer, Order, Product
+
+    call_command("migrate", verbosity=0)
+    existing = Order.objects.count()
+    if existing >= orders:
+        return
+    with transaction.atomic():
+        customers = list(Customer.objects.all()[:1000]) or Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"c{i}@example.com") for i in range(1000)
+        )
+        products = list(Product.objects.all()[:50]) or Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=Decimal("9.99"), stock=100) for i in range(50)
+        )
+        rows = Order.objects.bulk_create(
+            (Order(customer=customers[i % len(customers)], total_amount=Decimal("9.99"))
+             for i in range(existing, orders)),
+            batch_size=5000,
+        )
+        Order.products.through.objects.bulk_create(
+            (Order.products.through(order_id=o.pk, product_id=products[o.pk % len(products)].pk) for o in rows),
+            batch_size=5000,
+        )
+
+
+def timed(client, repeat):
+    payload = json.dumps({"query": QUERY})
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.post("/graphql", data=payload, content_type="application/json")
+        samples.append((time.perf_counter() - start) * 1000.0)
+    body = json.loads(response.content)
+    if body.get("errors"):
+        raise SystemExit(f"Query failed: {body['errors']}")
+    return statistics.median(samples), body["data"]["allOrders"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", default="/tmp/crm_bench_counts.sqlite3")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import Client
+
+    from crm.counts import STRATEGIES
+
+    client = Client()
+    print(f"{'orders':>8} {'strategy':<10} {'median':>10} {'totalCount':>11} {'exact':>6}")
+    for size in sorted(args.sizes):
+        grow(size)
+        for strategy in STRATEGIES:
+            settings.CRM_COUNT_STRATEGIES = {"allOrders": strategy}
+            cache.clear()
+            median, result = timed(client, args.repeat)
+            print(f"{size:>8} {strategy:<10} {median:>8.2f}ms {result['totalCount']:>11} {result['isCountExact']!s:>6}")
+
+
+if __name__ == "__main__":
+    main()
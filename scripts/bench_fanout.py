@@ -0,0 +1,70 @@
+"""Fan one orderCreated event out to thousands of in-process subscribers.
+
+Measures publish -> last delivery latency through crm.subscriptions, and
+shows bounded queues shedding load for consumers that never read:
+
+    python scripts/bench_fanout.py --subscribers 5000 --events 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+import django  # noqa: E402
+django.setup()
+
+from crm.models import Order  # noqa: E402
+from crm.subscriptions import get_hub  # noqa: E402
+
+QUERY = "subscription { orderCreated { id totalAmount customer { email } } }"
+
+
+async def run(subscribers, events, filters, pk):
+    hub = get_hub()
+    members = []
+    for i in range(subscribers):
+        # a handful of distinct filters -> a handful of executions per event
+        variables = {"f": {"totalAmountGte": str(i % filters)}} if filters > 1 else None
+        query = "subscription($f: OrderFilterInput) { orderCreated(filter: $f) { id totalAmount customer { email } } }" \
+            if variables else QUERY
+        members.append(hub.subscribe(query, variables)[1])
+    print(f"{subscribers} subscribers in {len(hub.groups)} group(s)")
+
+    latencies = []
+    for _ in range(events):
+        start = time.perf_counter()
+        await asyncio.to_thread(hub.broker.publish, "orderCreated", {"pk": pk})
+        # the first half are fast readers, the rest never read (slow consumers)
+        await asyncio.gather(*(m.get() for m in members[: subscribers // 2]))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    slow = members[subscribers // 2:]
+    print(f"{events} events: p50 {latencies[len(latencies) // 2]:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms to reach {subscribers // 2} readers")
+    print(f"slow consumers: queue depth {max(m.queue.qsize() for m in slow)} (bounded), "
+          f"dropped {sum(m.dropped for m in slow)} events total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--filters", type=int, default=1, help="Distinct filter variables across subscribers")
+    args = parser.parse_args()
+
+    pk = Order.objects.values_list("pk", flat=True).first()
+    if pk is None:
+        raise SystemExit("Seed at least one order first (python seed_db.py)")
+    asyncio.run(run(args.subscribers, args.events, args.filters, pk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measure cold-start import time of job processes with ``python -X importtime``.
+
+Exits non-zero when a profile exceeds its budget so it can gate CI:
+
+    python scripts/bench_importtime.py
+    python scripts/bench_importtime.py --budget-ms 400 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label, settings module, snippet, default budget in ms)
+PROFILES = [
+    ("cleanup job (lean)", "crm.settings_jobs",
+     "import django; django.setup(); import crm.models", 350),
+    ("celery worker (lean)", "crm.settings_jobs",
+     "import django; django.setup(); import crm.tasks", 600),
+    ("web (full settings)", "crm.settings",
+     "import django; django.setup()", None),
+]
+
+
+def measure(settings_module, snippet):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        # nested imports are indented; top-level ones carry the full cost
+        if module[1:] == module.strip():
+            rows.append((int(cumulative_us), module.strip()))
+    return sum(c for c, _ in rows) / 1000.0, sorted(rows, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, help="Override the budget of every lean profile")
+    parser.add_argument("--top", type=int, default=5, help="Show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    failed = False
+    for label, settings_module, snippet, budget in PROFILES:
+        total_ms, rows = measure(settings_module, snippet)
+        if budget is not None and args.budget_ms is not None:
+            budget = args.budget_ms
+        status = ""
+        if budget is not None:
+            ok = total_ms <= budget
+            failed |= not ok
+            status = f" (budget {budget:.0f} ms: {'ok' if ok else 'OVER'})"
+        print(f"{label}: {total_ms:.1f} ms{status}")
+        for cumulative_us, module in rows[:args.top]:
+            print(f"    {cumulative_us / 1000.0:8.1f} ms  {module}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Latency and bytes read for narrow queries with and without field projection.
+
+Seeds a scratch SQLite database, then runs each query with
+``CRM_QUERY_PROJECTION`` off (full rows, default joins and prefetches) and on:
+
+    python scripts/bench_projection.py --orders 20000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+QUERIES = {
+    # the reminder job's selection (crm/cron_jobs/send_order_reminders.py)
+    "reminders": "query ($first: Int) { allOrders(first: $first) "
+                 "{ edges { node { id orderDate customer { email } } } } }",
+    "order totals": "query ($first: Int) { allOrders(first: $first) { edges { node { id totalAmount } } } }",
+    "customer emails": "query ($first: Int) { allCustomers(first: $first) { edges { node { email } } } }",
+}
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+
+def seed(orders):
+    from decimal import Decimal
+
+    from django.core.management import call_command
+    from django.db import transaction
+
+    from crm.models import Customer, Order, Product
+
+    call_command("migrate", verbosity=0)
+    if Order.objects.count() >= orders:
+        return
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"c{i}@example.com", phone="+15550000000") for i in range(2000)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=Decimal("9.99"), stock=100) for i in range(50)
+        )
+        rows = Order.objects.bulk_create(
+            (Order(customer=customers[i % len(customers)], total_amount=Decimal("29.97")) for i in range(orders)),
+            batch_size=5000,
+        )
+        Order.products.through.objects.bulk_create(
+            (Order.products.through(order_id=o.pk, product_id=products[(i + k) % len(products)].pk)
+             for i, o in enumerate(rows) for k in range(3)),
+            batch_size=5000,
+        )
+
+
+@contextmanager
+def capture_sql():
+    """Record (sql, params) of every query run inside the block."""
+    from django.db import connection
+
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield statements
+
+
+def bytes_read(statements):
+    """Re-run the captured statements and total the size of every value returned."""
+    from django.db import connection
+
+    total = 0
+    with connection.cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            for row in cursor.fetchall():
+                total += sum(len(str(value).encode()) for value in row if value is not None)
+    return total
+
+
+def run(client, query, first, repeat):
+    payload = json.dumps({"query": query, "variables": {"first": first}})
+    with capture_sql() as statements:
+        response = client.post("/graphql", data=payload, content_type="application/json")
+    body = json.loads(response.content)
+    if body.get("errors"):
+        raise SystemExit(f"Query failed: {body['errors']}")
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.post("/graphql", data=payload, content_type="application/json")
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples), len(statements), bytes_read(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--first", type=int, default=5000, help="Edges requested per query")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--db", default="/tmp/crm_bench_projection.sqlite3")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    seed(args.orders)
+
+    from django.conf import settings
+    from django.test import Client
+    from graphene_django.settings import graphene_settings
+
+    graphene_settings.RELAY_CONNECTION_MAX_LIMIT = None
+    client = Client()
+
+    print(f"{'query':<16} {'mode':<10} {'median':>10} {'queries':>8} {'bytes read':>12}")
+    for name, query in QUERIES.items():
+        results = {}
+        for mode, enabled in (("full rows", False), ("projected", True)):
+            settings.CRM_QUERY_PROJECTION = enabled
+            results[mode] = run(client, query, args.first, args.repeat)
+            median, queries, size = results[mode]
+            print(f"{name:<16} {mode:<10} {median:>8.1f}ms {queries:>8} {size:>12,}")
+        full, projected = results["full rows"], results["projected"]
+        print(f"{'':<16} {'gain':<10} {(1 - projected[0] / full[0]) * 100:>9.0f}% "
+              f"{'':>8} {(1 - projected[2] / full[2]) * 100:>11.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Parallel retry storms against mutations sent with an Idempotency-Key.
+
+Fires ``--retries`` identical copies of ``createOrder`` and
+``bulkCreateCustomers`` per key, all at once, for ``--keys`` keys, then checks
+that each key executed exactly once, that every copy got the same response,
+and that the rows written are exactly those the responses report.
+Exits 1 when it did not:
+
+    python scripts/bench_retry_storm.py --keys 20 --retries 16
+    python scripts/bench_retry_storm.py --url http://localhost:8000/graphql
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+CREATE_ORDER = """
+mutation($input: CreateOrderInput!) {
+  createOrder(input: $input) { order { id totalAmount } }
+}"""
+
+BULK_CREATE_CUSTOMERS = """
+mutation($input: [CreateCustomerInput!]!) {
+  bulkCreateCustomers(input: $input) { customers { id email } errors }
+}"""
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DATABASES["default"].setdefault("OPTIONS", {})["timeout"] = 30
+    django.setup()
+
+
+def seed():
+    from decimal import Decimal
+
+    from django.core.management import call_command
+
+    from crm.models import Customer, Product
+
+    call_command("migrate", verbosity=0)
+    customer = Customer.objects.filter(email="storm@example.com").first() or Customer.objects.create(
+        name="Storm", email="storm@example.com"
+    )
+    products = list(Product.objects.order_by("pk")[:3]) or Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=Decimal("9.99"), stock=100) for i in range(3)
+    )
+    return customer.pk, [p.pk for p in products]
+
+
+def in_process_sender():
+    from django.db import connections
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(payload, key):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = Client()
+        try:
+            response = client.post(
+                "/graphql", data=payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key
+            )
+        finally:
+            connections.close_all()
+        return response.status_code, response.content.decode(), response.headers.get("Idempotent-Replayed")
+    return send
+
+
+def http_sender(url):
+    import requests
+
+    def send(payload, key):
+        response = requests.post(
+            url, data=payload, headers={"Content-Type": "application/json", "Idempotency-Key": key}, timeout=60
+        )
+        return response.status_code, response.text, response.headers.get("Idempotent-Replayed")
+    return send
+
+
+def storm(send, payloads, retries, concurrency):
+    """Send every payload ``retries`` times concurrently; return results grouped by key."""
+    # copies of a key are adjacent, so they are in flight together
+    jobs = [(key, payload) for key, payload in payloads.items() for _ in range(retries)]
+    barrier = threading.Barrier(min(concurrency, len(jobs)))
+
+    def run(job):
+        key, payload = job
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        start = time.perf_counter()
+        status, body, replayed = send(payload, key)
+        return key, status, body, replayed, (time.perf_counter() - start) * 1000.0
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for key, status, body, replayed, elapsed in pool.map(run, jobs):
+            results.setdefault(key, []).append((status, body, replayed, elapsed))
+    return results
+
+
+def check(name, results):
+    """Return ``(failures, errored)``: deduplication failures, and keys whose one execution failed."""
+    failures, errored = [], []
+    for key, responses in results.items():
+        if len({(status, body) for status, body, _, _ in responses}) != 1:
+            failures.append(f"{name} {key}: responses differ: {sorted({s for s, *_ in responses})}")
+        executed = sum(1 for _, _, replayed, _ in responses if replayed != "true")
+        if executed != 1:
+            failures.append(f"{name} {key}: executed {executed} times")
+        status, body = responses[0][:2]
+        result = json.loads(body)
+        payload_errors = [e for payload in (result.get("data") or {}).values() for e in (payload or {}).get("errors") or []]
+        if status != 200 or result.get("errors") or payload_errors:
+            errored.append(f"{name} {key}: {status} {body[:160]}")
+    return failures, errored
+
+
+def reported(results, field, objects):
+    """Rows the stored responses say were created."""
+    total = 0
+    for responses in results.values():
+        payload = (json.loads(responses[0][1]).get("data") or {}).get(field) or {}
+        value = payload.get(objects)
+        total += len(value) if isinstance(value, list) else int(value is not None)
+    return total
+
+
+def report(name, results):
+    executed = [e for rs in results.values() for _, _, replayed, e in rs if replayed != "true"]
+    replayed = [e for rs in results.values() for _, _, r, e in rs if r == "true"]
+    print(f"{name:<20} {len(results):>5} keys {len(executed):>6} executed {len(replayed):>6} replayed   "
+          f"executed p50 {statistics.median(executed):7.1f}ms   "
+          f"replayed p50 {statistics.median(replayed) if replayed else 0:7.1f}ms "
+          f"max {max(replayed, default=0):7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=20)
+    parser.add_argument("--retries", type=int, default=16, help="Concurrent copies sent per key")
+    parser.add_argument("--concurrency", type=int, help="Requests in flight (default: --retries, one key at a "
+                        "time; SQLite fails concurrent writers for different keys with 'database is locked')")
+    parser.add_argument("--url", help="Send to a running server instead of in-process")
+    parser.add_argument("--db", default="/tmp/crm_bench_retry_storm.sqlite3")
+    args = parser.parse_args()
+    concurrency = args.concurrency or args.retries
+
+    setup_django(args.db)
+    customer_id, product_ids = seed()
+    send = http_sender(args.url) if args.url else in_process_sender()
+
+    from crm.models import Customer, Order
+
+    run_id = uuid.uuid4().hex[:8]
+    orders_before = Order.objects.count()
+    orders = {
+        f"order-{run_id}-{i}": json.dumps({"query": CREATE_ORDER, "variables": {
+            "input": {"customerId": customer_id, "productIds": product_ids[:1 + i % len(product_ids)]},
+        }})
+        for i in range(args.keys)
+    }
+    customers = {
+        f"customers-{run_id}-{i}": json.dumps({"query": BULK_CREATE_CUSTOMERS, "variables": {
+            "input": [{"name": f"Storm {i}.{n}", "email": f"storm-{run_id}-{i}-{n}@example.com"} for n in range(3)],
+        }})
+        for i in range(args.keys)
+    }
+
+    failures, errored, outcomes = [], [], {}
+    for name, payloads in (("createOrder", orders), ("bulkCreateCustomers", customers)):
+        outcomes[name] = results = storm(send, payloads, args.retries, concurrency)
+        report(name, results)
+        key_failures, key_errors = check(name, results)
+        failures += key_failures
+        errored += key_errors
+
+    # every row written must be one a stored response reports: no duplicate executions
+    created_orders = Order.objects.count() - orders_before
+    created_customers = Customer.objects.filter(email__startswith=f"storm-{run_id}-").count()
+    expected_orders = reported(outcomes["createOrder"], "createOrder", "order")
+    expected_customers = reported(outcomes["bulkCreateCustomers"], "bulkCreateCustomers", "customers")
+    print(f"rows created: {created_orders} orders (responses report {expected_orders}), "
+          f"{created_customers} customers (responses report {expected_customers})")
+    if created_orders != expected_orders:
+        failures.append(f"created {created_orders} orders, responses report {expected_orders}")
+    if created_customers != expected_customers:
+        failures.append(f"created {created_customers} customers, responses report {expected_customers}")
+
+    if errored:
+        # not a deduplication failure: the single execution failed and its response was stored
+        print(f"{len(errored)} keys failed in the mutation itself, e.g. {errored[0]}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
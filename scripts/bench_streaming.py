@@ -0,0 +1,162 @@
+"""Peak RSS and time-to-first-byte for buffered vs streamed connection responses.
+
+Seeds a scratch SQLite database once, then measures each mode in its own
+process so peak RSS is not shared between runs. ``streaming-asgi`` sends the
+streamed request through ``crm.asgi.application`` as an ASGI server would:
+
+    python scripts/bench_streaming.py --edges 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+QUERY = (
+    "query ($first: Int) { allOrders(first: $first) "
+    "{ edges { node { id orderDate totalAmount customer { email } } } } }"
+)
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    # connections are created lazily, so the scratch DB can be swapped in here
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+
+def seed(db_path, edges):
+    from decimal import Decimal
+
+    from django.core.management import call_command
+    from django.db import transaction
+
+    from crm.models import Customer, Order, Product
+
+    call_command("migrate", verbosity=0)
+    if Order.objects.count() >= edges:
+        return
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"c{i}@example.com") for i in range(1000)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=Decimal("9.99"), stock=100) for i in range(50)
+        )
+        orders = Order.objects.bulk_create(
+            (Order(customer=customers[i % len(customers)], total_amount=Decimal("9.99")) for i in range(edges)),
+            batch_size=5000,
+        )
+        Order.products.through.objects.bulk_create(
+            (Order.products.through(order_id=o.pk, product_id=products[i % len(products)].pk)
+             for i, o in enumerate(orders)),
+            batch_size=5000,
+        )
+
+
+def measure(mode, edges):
+    from django.test import Client
+    from graphene_django.settings import graphene_settings
+
+    # the buffered path is capped at 100 edges by default
+    graphene_settings.RELAY_CONNECTION_MAX_LIMIT = None
+    client = Client()
+    payload = json.dumps({"query": QUERY, "variables": {"first": edges}})
+    path = "/graphql?stream=1" if mode == "streaming" else "/graphql"
+
+    client.post(path, data=json.dumps({"query": "{ hello }"}), content_type="application/json")  # warm up
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    response = client.post(path, data=payload, content_type="application/json")
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        size = len(next(chunks))
+        ttfb = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+    else:
+        ttfb = time.perf_counter() - start
+        size = len(response.content)
+    total = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode, "status": response.status_code, "bytes": size,
+        "ttfb_ms": ttfb * 1000, "total_ms": total * 1000,
+        "peak_rss_mb": peak_rss / 1024, "rss_growth_mb": (peak_rss - base_rss) / 1024,
+    }
+
+
+def measure_asgi(edges):
+    import asyncio
+
+    from graphene_django.settings import graphene_settings
+
+    from crm.asgi import application
+
+    graphene_settings.RELAY_CONNECTION_MAX_LIMIT = None
+    body = json.dumps({"query": QUERY, "variables": {"first": edges}}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/graphql", "raw_path": b"/graphql", "query_string": b"stream=1",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"localhost")],
+        "server": ("localhost", 80), "client": ("127.0.0.1", 1234),
+    }
+    result = {"mode": "streaming-asgi", "bytes": 0, "ttfb_ms": None}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if result["ttfb_ms"] is None:
+                result["ttfb_ms"] = (time.perf_counter() - start) * 1000
+            result["bytes"] += len(message["body"])
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    asyncio.run(application(scope, receive, send))
+    result["total_ms"] = (time.perf_counter() - start) * 1000
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result.update(peak_rss_mb=peak_rss / 1024, rss_growth_mb=(peak_rss - base_rss) / 1024)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--db", default="/tmp/crm_bench_streaming.sqlite3")
+    parser.add_argument("--mode", choices=["buffered", "streaming", "streaming-asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    if args.mode:
+        result = measure_asgi(args.edges) if args.mode == "streaming-asgi" else measure(args.mode, args.edges)
+        print(json.dumps(result))
+        return
+
+    seed(args.db, args.edges)
+    for mode in ("buffered", "streaming", "streaming-asgi"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--edges", str(args.edges), "--db", args.db],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{r['mode']:>14}: HTTP {r['status']}, {r['bytes'] / 1e6:.1f} MB, "
+              f"TTFB {r['ttfb_ms']:.0f} ms, total {r['total_ms']:.0f} ms, "
+              f"peak RSS {r['peak_rss_mb']:.0f} MB (+{r['rss_growth_mb']:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
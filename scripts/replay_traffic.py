@@ -0,0 +1,387 @@
+"""Replay recorded GraphQL traffic and report latency and DB queries per operation.
+
+The log is JSONL, one operation per line, as written by ``CRM_GRAPHQL_TRAFFIC_LOG``:
+``{"ts": 1760000000.0, "operationName": null, "query": "...", "variables": {...}}``
+(``ts``, ``operationName`` and ``variables`` are optional).
+
+Requests go through the Django test client in-process, or to ``--url``.
+``--mode`` picks a thread pool, a process pool or asyncio tasks, with
+``--concurrency`` requests in flight. Without ``--rate`` the replay is
+closed-loop (the next request leaves when a slot frees up). ``--rate`` and
+``--recorded-timing`` make it open-loop, and latency is measured from each
+request's scheduled send time, so queueing counts against it.
+
+    python scripts/replay_traffic.py scripts/traffic_sample.jsonl --repeat 50 --concurrency 4
+    python scripts/replay_traffic.py traffic.jsonl --url http://localhost:8000/graphql --mode asyncio --rate 200
+    python scripts/replay_traffic.py traffic.jsonl --save baseline.json
+    python scripts/replay_traffic.py traffic.jsonl --compare baseline.json   # exits 1 on regression
+
+DB queries come from the ``X-DB-Queries`` header (``CRM_QUERY_COUNT_HEADER``,
+forced on in-process).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+
+
+# -- loading ---------------------------------------------------------------
+
+def describe(entry):
+    """(display name, is_mutation) for a logged operation."""
+    from graphql import FieldNode, GraphQLError, OperationDefinitionNode, OperationType, parse
+
+    try:
+        document = parse(entry.get("query") or "")
+    except GraphQLError:
+        return "<invalid>", False
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    wanted = entry.get("operationName")
+    operation = next((o for o in operations if not wanted or (o.name and o.name.value == wanted)), None)
+    if operation is None:
+        return wanted or "<no operation>", False
+    is_mutation = operation.operation == OperationType.MUTATION
+    if operation.name:
+        return operation.name.value, is_mutation
+    fields = ",".join(s.name.value for s in operation.selection_set.selections if isinstance(s, FieldNode))
+    return f"{operation.operation.value} {{{fields}}}", is_mutation
+
+
+def load_operations(path, read_only=False):
+    operations = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                raise SystemExit(f"{path}:{number}: not valid JSON")
+            name, is_mutation = describe(entry)
+            if read_only and is_mutation:
+                continue
+            payload = {"query": entry.get("query"), "variables": entry.get("variables") or {}}
+            if entry.get("operationName"):
+                payload["operationName"] = entry["operationName"]
+            operations.append({"name": name, "payload": json.dumps(payload), "ts": entry.get("ts")})
+    if not operations:
+        raise SystemExit(f"{path}: no operations to replay")
+    return operations
+
+
+def schedule(operations, rate=None, recorded_timing=False, speed=1.0):
+    """Send offsets in seconds from the start, or None for closed-loop."""
+    if rate:
+        return [i / rate for i in range(len(operations))]
+    if recorded_timing:
+        stamps = [op["ts"] for op in operations]
+        if any(ts is None for ts in stamps):
+            raise SystemExit("--recorded-timing needs a `ts` on every line")
+        # repeated passes continue after the previous pass's span
+        offsets, base, last = [], stamps[0], stamps[0]
+        shift = 0.0
+        for ts in stamps:
+            if ts < last:
+                shift += last - base
+            offsets.append((ts - base + shift) / speed)
+            last = ts
+        return offsets
+    return [None] * len(operations)
+
+
+# -- senders ---------------------------------------------------------------
+
+def _outcome(status, body, queries):
+    ok = status == 200
+    if ok:
+        try:
+            ok = not json.loads(body).get("errors")
+        except (ValueError, AttributeError):
+            ok = False
+    return status, ok, int(queries) if queries is not None else None
+
+
+class DjangoSender:
+    """In-process requests through the Django test client (one client per thread)."""
+
+    def __init__(self, path="/graphql"):
+        import django
+        from django.conf import settings
+
+        django.setup()
+        settings.CRM_QUERY_COUNT_HEADER = True
+        self.path = path
+        self._local = threading.local()
+
+    def __call__(self, payload):
+        from django.test import Client
+
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client()
+        response = client.post(self.path, data=payload, content_type="application/json")
+        return _outcome(response.status_code, response.content, response.get(QUERY_COUNT_HEADER))
+
+
+class HTTPSender:
+    """Requests to a running server (one session per thread)."""
+
+    def __init__(self, url):
+        self.url = url
+        self._local = threading.local()
+
+    def __call__(self, payload):
+        import requests
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.post(self.url, data=payload, headers={"Content-Type": "application/json"})
+        return _outcome(response.status_code, response.content, response.headers.get(QUERY_COUNT_HEADER))
+
+
+class AsyncDjangoSender:
+    """In-process requests through Django's ASGI handler."""
+
+    def __init__(self, path="/graphql"):
+        import django
+        from django.conf import settings
+        from django.test import AsyncClient
+
+        django.setup()
+        settings.CRM_QUERY_COUNT_HEADER = True
+        self.path = path
+        self.client = AsyncClient()
+
+    async def __call__(self, payload):
+        response = await self.client.post(self.path, data=payload, content_type="application/json")
+        return _outcome(response.status_code, response.content, response.get(QUERY_COUNT_HEADER))
+
+    async def close(self):
+        pass
+
+
+class AsyncHTTPSender:
+    def __init__(self, url):
+        import aiohttp
+
+        self.url = url
+        self.session = aiohttp.ClientSession(headers={"Content-Type": "application/json"})
+
+    async def __call__(self, payload):
+        async with self.session.post(self.url, data=payload) as response:
+            body = await response.read()
+            return _outcome(response.status, body, response.headers.get(QUERY_COUNT_HEADER))
+
+    async def close(self):
+        await self.session.close()
+
+
+def timed_send(send, operation, scheduled=None):
+    """Send one operation; latency runs from ``scheduled`` (wall clock) when open-loop."""
+    start = time.time()
+    status, ok, queries = send(operation["payload"])
+    return operation["name"], (time.time() - (scheduled or start)) * 1000.0, status, ok, queries
+
+
+# process pool workers keep their own sender
+_worker_sender = None
+
+
+def _init_worker(url):
+    global _worker_sender
+    _worker_sender = HTTPSender(url) if url else DjangoSender()
+
+
+def _worker_send(operation, scheduled):
+    return timed_send(_worker_sender, operation, scheduled)
+
+
+# -- dispatch --------------------------------------------------------------
+
+def _pace(start, offset):
+    """Sleep until ``offset`` seconds after ``start``; return the scheduled wall time."""
+    if offset is None:
+        return None
+    delay = start + offset - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    return start + offset
+
+
+def run_pool(mode, url, operations, offsets, concurrency):
+    if mode == "process":
+        pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker, initargs=(url,))
+        submit = partial_submit(pool, _worker_send)
+        # start every worker before the clock does
+        list(pool.map(_worker_send, operations[:concurrency], [None] * min(concurrency, len(operations))))
+    else:
+        sender = HTTPSender(url) if url else DjangoSender()
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        submit = partial_submit(pool, timed_send, sender)
+    with pool:
+        start = time.time()
+        futures = [submit(op, _pace(start, offset)) for op, offset in zip(operations, offsets)]
+        results = [f.result() for f in futures]
+    return results, time.time() - start
+
+
+def partial_submit(pool, fn, *leading):
+    return lambda *args: pool.submit(fn, *leading, *args)
+
+
+async def run_async(url, operations, offsets, concurrency):
+    sender = AsyncHTTPSender(url) if url else AsyncDjangoSender()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(operation, scheduled):
+        async with slots:
+            start = time.time()
+            status, ok, queries = await sender(operation["payload"])
+            return operation["name"], (time.time() - (scheduled or start)) * 1000.0, status, ok, queries
+
+    try:
+        start = time.time()
+        tasks = []
+        for operation, offset in zip(operations, offsets):
+            scheduled = None
+            if offset is not None:
+                scheduled = start + offset
+                await asyncio.sleep(max(0.0, scheduled - time.time()))
+            tasks.append(asyncio.create_task(one(operation, scheduled)))
+        results = await asyncio.gather(*tasks)
+        return results, time.time() - start
+    finally:
+        await sender.close()
+
+
+# -- reporting -------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(results, elapsed):
+    by_name = defaultdict(list)
+    for result in results:
+        by_name[result[0]].append(result)
+    operations = {}
+    for name, rows in sorted(by_name.items()):
+        latencies = sorted(r[1] for r in rows)
+        queries = [r[4] for r in rows if r[4] is not None]
+        operations[name] = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if not r[3]),
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1],
+            "queries": statistics.mean(queries) if queries else None,
+        }
+    return {
+        "requests": len(results),
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "statuses": dict(Counter(str(r[2]) for r in results)),
+        "operations": operations,
+    }
+
+
+def print_report(report):
+    width = max([9] + [len(name) for name in report["operations"]])
+    print(f"{report['requests']} requests in {report['elapsed']:.2f}s: "
+          f"{report['throughput']:.1f} req/s, statuses {report['statuses']}")
+    print(f"{'operation':<{width}} {'count':>6} {'errors':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'queries':>8}")
+    for name, s in report["operations"].items():
+        queries = f"{s['queries']:.1f}" if s["queries"] is not None else "-"
+        print(f"{name:<{width}} {s['count']:>6} {s['errors']:>6} {s['p50']:>6.1f}ms {s['p90']:>6.1f}ms "
+              f"{s['p99']:>6.1f}ms {s['max']:>6.1f}ms {queries:>8}")
+
+
+def compare(report, baseline, max_regression, floor_ms):
+    """Regressions against a saved report: slower p90 beyond the tolerance, or more queries."""
+    problems = []
+    for name, current in report["operations"].items():
+        before = baseline["operations"].get(name)
+        if before is None:
+            continue
+        if current["p90"] > before["p90"] * (1 + max_regression) + floor_ms:
+            problems.append(f"{name}: p90 {before['p90']:.1f}ms -> {current['p90']:.1f}ms")
+        if current["queries"] is not None and before["queries"] is not None \
+                and current["queries"] > before["queries"] + 0.01:
+            problems.append(f"{name}: queries {before['queries']:.1f} -> {current['queries']:.1f}")
+        if current["errors"] > before["errors"]:
+            problems.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="JSONL file of recorded operations")
+    parser.add_argument("--url", help="GraphQL endpoint of a running server (default: in-process)")
+    parser.add_argument("--mode", choices=("thread", "process", "asyncio"), default="thread")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/s")
+    parser.add_argument("--recorded-timing", action="store_true", help="Open-loop at the logged `ts` spacing")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression for --recorded-timing")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the log")
+    parser.add_argument("--warmup", type=int, default=0, help="Operations sent first and left out of the report")
+    parser.add_argument("--read-only", action="store_true", help="Skip mutations")
+    parser.add_argument("--save", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline report to check against; exit 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed relative p90 increase")
+    parser.add_argument("--floor-ms", type=float, default=2.0, help="Absolute p90 slack for fast operations")
+    args = parser.parse_args()
+
+    if args.rate and args.recorded_timing:
+        parser.error("--rate and --recorded-timing are exclusive")
+    if args.url is None and args.mode == "asyncio" and args.concurrency > 1:
+        print("note: in-process asyncio runs sync views on one thread (as under ASGI)", file=sys.stderr)
+
+    operations = load_operations(args.log, args.read_only) * args.repeat
+    warmup, operations = operations[:args.warmup], operations[args.warmup:]
+    offsets = schedule(operations, args.rate, args.recorded_timing, args.speed)
+
+    if args.mode == "asyncio":
+        if warmup:
+            asyncio.run(run_async(args.url, warmup, [None] * len(warmup), args.concurrency))
+        results, elapsed = asyncio.run(run_async(args.url, operations, offsets, args.concurrency))
+    else:
+        if warmup:
+            run_pool(args.mode, args.url, warmup, [None] * len(warmup), args.concurrency)
+        results, elapsed = run_pool(args.mode, args.url, operations, offsets, args.concurrency)
+
+    report = summarize(results, elapsed)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.max_regression, args.floor_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ def main():
     order.products.set([laptop, mouse])
     order.total_amount = laptop.price + mouse.price
     order.save()
+    Customer.record_order(alice.pk, order.total_amount, order.order_date)
     print("Seeded sample data.")
 
 